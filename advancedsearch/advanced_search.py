@@ -1,6 +1,7 @@
 import os
 import fitz
 from typing import List
+from monitoring.metrics import time_stage, timed
 
 
 class AdvancedSearch:
@@ -13,6 +14,7 @@ class AdvancedSearch:
         self.pdf_directory = pdf_directory
         self.index = {}
 
+    @timed("advanced_search", "build_index")
     def build_index(self):
         """
         Build an index of PDF files in the specified directory.
@@ -25,6 +27,7 @@ class AdvancedSearch:
                 text = self.extract_text_from_pdf(filepath)
                 self.index[filename] = text
 
+    @timed("advanced_search", "pdf_extraction")
     def extract_text_from_pdf(self, pdf_path: str) -> str:
         """
         Extract text content from a PDF file.
@@ -53,9 +56,10 @@ class AdvancedSearch:
 
         search_terms_lower = [term.lower() for term in search_terms]  # to handle case sensitive issues
 
-        for filename, text in self.index.items():
-            text_lower = text.lower()
-            if any(term in text_lower for term in search_terms_lower):
-                results.append(filename)
+        with time_stage("advanced_search", "term_matching"):
+            for filename, text in self.index.items():
+                text_lower = text.lower()
+                if any(term in text_lower for term in search_terms_lower):
+                    results.append(filename)
 
         return results
@@ -1,44 +1,79 @@
 import os
+import hashlib
 import fitz
 import logging
 import re
 from collections import defaultdict, Counter
+from autosearch.similarity import SimilarityIndex
+from autosearch.spelling import SymSpellIndex
+from monitoring.metrics import DOCUMENTS_INDEXED, INDEX_NGRAMS, INDEX_UNIQUE_WORDS, REGISTRY, time_stage, timed
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 
+def document_shard(filename, num_shards):
+    """
+    Map a document to the shard that owns it.
+
+    :param filename: Name of the document.
+    :param num_shards: Total number of shards.
+    :return: Shard number in ``range(num_shards)``.
+    """
+    digest = hashlib.md5(filename.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % num_shards
+
+
 class Indexer:
-    def __init__(self, pdf_directory):
+    def __init__(self, pdf_directory, shard_id=0, num_shards=1):
         """
         Initialize the Indexer with a directory containing PDF files.
 
         :param pdf_directory: Directory where the PDF files are stored.
+        :param shard_id: Shard served by this indexer when the corpus is partitioned.
+        :param num_shards: Total number of shards; 1 indexes every document.
         """
         self.pdf_directory = pdf_directory
+        self.shard_id = shard_id
+        self.num_shards = num_shards
         self.index = defaultdict(list)
         self.words = set()
         self.ngrams = Counter()
+        self.spelling = SymSpellIndex(max_edit_distance=2)
         self.stopwords = {"the", "on", "with", "for", "and", "of", "or", "as", "at", "in", "by", "to", "its", "from",
                           "such", "this", "any", "date", "a", "is", "all", "that", "an", "above"}
+        self.similarity = SimilarityIndex(stopwords=self.stopwords)
         self.build_index()
 
+    def owns(self, filename):
+        """
+        Check whether a document belongs to this indexer's shard.
+
+        :param filename: Name of the document.
+        :return: True if the document is indexed by this shard.
+        """
+        return self.num_shards == 1 or document_shard(filename, self.num_shards) == self.shard_id
+
+    @timed("indexer", "build_index")
     def build_index(self):
         """
         Build an index from PDF files in the specified directory.
         """
         logging.info("Building index from PDFs...")
         for filename in os.listdir(self.pdf_directory):
-            if filename.endswith(".pdf"):
+            if filename.endswith(".pdf") and self.owns(filename):
                 pdf_path = os.path.join(self.pdf_directory, filename)
                 try:
-                    doc = fitz.open(pdf_path)
-                    text = ""
-                    for page in doc:
-                        text += page.get_text("text") + "\n"
-                    doc.close()
-
-                    words = re.findall(r'\b\w+\b', text.lower())
+                    with time_stage("indexer", "pdf_extraction"):
+                        doc = fitz.open(pdf_path)
+                        text = ""
+                        for page in doc:
+                            text += page.get_text("text") + "\n"
+                        doc.close()
+
+                    with time_stage("indexer", "tokenization"):
+                        words = re.findall(r'\b\w+\b', text.lower())
                     self.words.update(words)
-                    self.index_document(filename, words)
+                    with time_stage("indexer", "index_document"):
+                        self.index_document(filename, words)
                     logging.info(
                         f"Indexed terms for {filename}: {words[:100]}")  # Display the first 100 terms for brevity
                     logging.info(
@@ -46,6 +81,9 @@ class Indexer:
                 except Exception as e:
                     logging.error(f"Error indexing file {filename}: {str(e)}")
         logging.info(f"Index built with {len(self.words)} unique words.")
+        INDEX_UNIQUE_WORDS.set(len(self.words), shard=self.shard_id)
+        INDEX_NGRAMS.set(len(self.ngrams), shard=self.shard_id)
+        DOCUMENTS_INDEXED.set(len(self.similarity.filenames), shard=self.shard_id)
         logging.info(f"Sample indexed words: {list(self.words)[:50]}")
 
     def index_document(self, filename, words):
@@ -60,6 +98,7 @@ class Indexer:
             unigram = words[i]
             self.ngrams[(unigram,)] += 1
             self.index[unigram].append(filename)
+            self.spelling.add_word(unigram)
             if i < len(words) - 1:
                 bigram = (words[i], words[i + 1])
                 self.ngrams[bigram] += 1
@@ -72,16 +111,60 @@ class Indexer:
             f"Indexed bigrams: {[bigram for bigram in self.ngrams.keys() if len(bigram) == 2][:100]}")  # Display the first 100 bigrams
         logging.info(
             f"Indexed trigrams: {[trigram for trigram in self.ngrams.keys() if len(trigram) == 3][:100]}")  # Display the first 100 trigrams
+        self.similarity.add_document(filename, words)
+
+    def suggest_corrections(self, term, limit=5):
+        """
+        Suggest vocabulary words close to a possibly misspelled term.
+
+        :param term: Term to correct.
+        :param limit: Maximum number of suggestions.
+        :return: List of (word, edit distance, frequency) tuples, best first.
+        """
+        term = term.lower()
+        max_edit_distance = 1 if len(term) <= 4 else 2
+        return self.spelling.lookup(term, max_edit_distance=max_edit_distance, limit=limit)
 
-    def search(self, query, filename=None):
+    def suggest_term_corrections(self, terms, limit=5):
+        """
+        Suggest corrections for several terms at once, so a shard answers a whole query in one call.
+
+        :param terms: Terms to correct.
+        :param limit: Maximum number of suggestions per term.
+        :return: Dictionary mapping each term to its list of (word, edit distance, frequency) tuples.
+        """
+        return {term: self.suggest_corrections(term, limit) for term in terms}
+
+    @timed("indexer", "spelling_correction")
+    def correct_query(self, query):
+        """
+        Replace query terms that are not in the vocabulary with their closest known word.
+
+        :param query: Search query string.
+        :return: The corrected query string (lowercased).
+        """
+        corrected = []
+        for term in query.lower().split():
+            if term in self.spelling or len(term) < 3 or not term.isalpha():
+                corrected.append(term)
+                continue
+            suggestions = self.suggest_corrections(term, limit=1)
+            corrected.append(suggestions[0][0] if suggestions else term)
+        return ' '.join(corrected)
+
+    @timed("indexer", "search")
+    def search(self, query, filename=None, correct=True):
         """
         Search for query terms in the indexed documents.
 
         :param query: Search query string.
         :param filename: Optional filename to restrict the search to a specific PDF.
+        :param correct: Whether to replace misspelled query terms with their closest indexed word.
         :return: List of search results with filenames and match percentages.
         :raises FileNotFoundError: If the specified file is not found.
         """
+        if correct:
+            query = self.correct_query(query)
         query_terms = query.lower().split()
         document_matches = defaultdict(int)
 
@@ -90,17 +173,19 @@ class Indexer:
                 raise FileNotFoundError(f"File {filename} not found in directory.")
             pdf_files = [filename]
         else:
-            pdf_files = os.listdir(self.pdf_directory)
+            pdf_files = [pdf_file for pdf_file in os.listdir(self.pdf_directory) if self.owns(pdf_file)]
 
         for pdf_file in pdf_files:
             pdf_path = os.path.join(self.pdf_directory, pdf_file)
-            doc = fitz.open(pdf_path)
-            text = ""
-            for page in doc:
-                text += page.get_text("text") + "\n"
-            doc.close()
-
-            words = re.findall(r'\b\w+\b', text.lower())
+            with time_stage("indexer", "pdf_extraction"):
+                doc = fitz.open(pdf_path)
+                text = ""
+                for page in doc:
+                    text += page.get_text("text") + "\n"
+                doc.close()
+
+            with time_stage("indexer", "tokenization"):
+                words = re.findall(r'\b\w+\b', text.lower())
             for term in query_terms:
                 if term in words:
                     document_matches[pdf_file] += 1
@@ -117,6 +202,7 @@ class Indexer:
 
         return sorted(results, key=lambda x: x["match_percentage"], reverse=True)
 
+    @timed("indexer", "context_snippets")
     def get_context_matches(self, filename, query_terms):  # highlight terms that are being found,Handle Tap/Click to
         # Jump to Sections:
         """
@@ -148,26 +234,87 @@ class Indexer:
 
         return matches
 
-    def autocomplete(self, query):
+    @timed("indexer", "similar_documents")
+    def similar_documents(self, filename, top_k=5):
+        """
+        Find the indexed documents most similar to a given document.
+
+        :param filename: Name of the reference document.
+        :param top_k: Number of similar documents to return.
+        :return: List of similar documents with filenames and cosine similarity scores.
+        :raises FileNotFoundError: If the specified file has not been indexed.
+        """
+        if filename not in self.similarity:
+            raise FileNotFoundError(f"File {filename} not found in index.")
+        return self.similarity.most_similar(filename, top_k)
+
+    def document_term_counts(self, filename):
+        """
+        Return the term counts recorded for a document in the similarity index.
+
+        :param filename: Name of the document.
+        :return: Dictionary mapping terms to their counts.
+        :raises FileNotFoundError: If the specified file has not been indexed.
+        """
+        if filename not in self.similarity:
+            raise FileNotFoundError(f"File {filename} not found in index.")
+        return self.similarity.document_counts(filename)
+
+    def similar_to_term_counts(self, term_counts, top_k=5, exclude=()):
+        """
+        Find the indexed documents most similar to a bag of term counts.
+
+        :param term_counts: Dictionary mapping terms to their counts.
+        :param top_k: Number of similar documents to return.
+        :param exclude: Filenames to leave out of the results.
+        :return: List of similar documents with filenames and cosine similarity scores.
+        """
+        return self.similarity.most_similar_to_counts(term_counts, top_k, exclude)
+
+    def metrics_snapshot(self):
+        """
+        Copy the metrics of the process holding this index, so a shard server can report them.
+
+        :return: Registry snapshot mapping metric names to their values.
+        """
+        return REGISTRY.snapshot()
+
+    def autocomplete(self, query, correct=True):
         """
         Provide autocomplete suggestions based on the query.
 
         :param query: Autocomplete query string.
+        :param correct: Whether to retry with a spelling-corrected query when nothing matches.
         :return: List of autocomplete suggestions.
         """
+        counts = self.autocomplete_counts(query)
+        if not counts and correct:
+            corrected = self.correct_query(query)
+            if corrected != query.lower():
+                logging.info(f"Autocomplete retrying '{query}' as '{corrected}'")
+                counts = self.autocomplete_counts(corrected)
+        suggestions = sorted(counts, key=lambda suggestion: (-counts[suggestion], suggestion))
+        logging.info(f"Autocomplete suggestions for '{query}': {suggestions}")
+        return suggestions
+
+    @timed("indexer", "autocomplete")
+    def autocomplete_counts(self, query):
+        """
+        Collect n-grams that start with the query, together with their counts.
+
+        :param query: Autocomplete query string.
+        :return: Dictionary mapping suggestions to their n-gram counts.
+        """
         query_lower = query.lower()
-        suggestions = set()
+        counts = {}
         logging.info(f"Query: {query_lower}")
-        for ngram in self.ngrams.keys():
-            if ' '.join(ngram).startswith(query_lower):
-                suggestions.add(' '.join(ngram))
-                logging.info(f"Matched ngram: {' '.join(ngram)}")
+        for ngram, count in self.ngrams.items():
+            suggestion = ' '.join(ngram)
+            if suggestion.startswith(query_lower):
+                counts[suggestion] = count
 
         # Remove stopwords from suggestions
-        suggestions = self.remove_stopwords(suggestions)
-
-        logging.info(f"Autocomplete suggestions for '{query}': {suggestions}")
-        return list(suggestions)
+        return {suggestion: counts[suggestion] for suggestion in self.remove_stopwords(counts)}
 
     def remove_stopwords(self, suggestions):
         """
@@ -179,6 +326,7 @@ class Indexer:
         return [suggestion for suggestion in suggestions if
                 not any(stopword in suggestion.split() for stopword in self.stopwords)]
 
+    @timed("indexer", "alternative_search")
     def alternative_search_results(self, query):
         """
         Provide alternative search results based on the query.
@@ -0,0 +1,435 @@
+import argparse
+import heapq
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+
+from autosearch.indexer import Indexer, document_shard
+
+# Shard requests and replies are pickled, so anyone who can authenticate to a shard
+# server can run arbitrary code in it. The shared secret is the only protection and
+# has no default.
+AUTHKEY_VARIABLE = "OWLEYES_SHARD_AUTHKEY"
+
+# Indexer methods a shard server will execute on behalf of a coordinator.
+SHARD_METHODS = {
+    "search",
+    "alternative_search_results",
+    "autocomplete_counts",
+    "suggest_corrections",
+    "suggest_term_corrections",
+    "similar_to_term_counts",
+    "document_term_counts",
+    "metrics_snapshot",
+}
+
+
+class LocalShard:
+    """
+    Shard served by an Indexer in the current process.
+    """
+
+    def __init__(self, indexer):
+        """
+        :param indexer: Indexer holding this shard's documents.
+        """
+        self.indexer = indexer
+
+    def call(self, method, *args, **kwargs):
+        """
+        Invoke an Indexer method on this shard.
+
+        :param method: Name of the Indexer method.
+        :return: The method's return value.
+        """
+        return getattr(self.indexer, method)(*args, **kwargs)
+
+    def close(self):
+        pass
+
+
+class RemoteShard:
+    """
+    Shard served by another process or node through ``serve_shard``.
+
+    Connections are pooled so that concurrent requests to the same shard do not
+    queue behind each other.
+    """
+
+    def __init__(self, address, authkey):
+        """
+        :param address: (host, port) the shard server listens on.
+        :param authkey: Shared secret used to authenticate connections.
+        """
+        self.address = tuple(address)
+        self.authkey = authkey
+        self._connections = queue.LifoQueue()
+
+    def call(self, method, *args, **kwargs):
+        """
+        Invoke an Indexer method on the remote shard.
+
+        :param method: Name of the Indexer method.
+        :return: The method's return value.
+        :raises Exception: Whatever the remote method raised.
+        """
+        try:
+            connection = self._connections.get_nowait()
+        except queue.Empty:
+            connection = Client(self.address, authkey=self.authkey)
+
+        try:
+            connection.send((method, args, kwargs))
+            status, payload = connection.recv()
+        except (EOFError, OSError):
+            connection.close()
+            raise
+        self._connections.put(connection)
+
+        if status == "error":
+            raise payload
+        return payload
+
+    def close(self):
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class ShardCoordinator:
+    """
+    Fans queries out to every shard and merges their results.
+
+    Exposes the same query methods as Indexer, so the API can use either.
+    """
+
+    def __init__(self, shards, processes=()):
+        """
+        :param shards: Shards ordered by shard number.
+        :param processes: Local shard server processes owned by this coordinator.
+        """
+        self.shards = list(shards)
+        self.processes = list(processes)
+        self.pool = ThreadPoolExecutor(max_workers=len(self.shards))
+
+    @classmethod
+    def connect(cls, addresses, authkey=None):
+        """
+        Create a coordinator for shards that are already being served.
+
+        :param addresses: (host, port) of each shard, ordered by shard number.
+        :param authkey: Shared secret used to authenticate connections; defaults to OWLEYES_SHARD_AUTHKEY.
+        :return: A ShardCoordinator.
+        :raises RuntimeError: If no secret is given and OWLEYES_SHARD_AUTHKEY is not set.
+        """
+        authkey = authkey or shard_authkey()
+        return cls([RemoteShard(address, authkey) for address in addresses])
+
+    def owner(self, filename):
+        """
+        Return the shard that owns a document.
+
+        :param filename: Name of the document.
+        :return: The owning shard.
+        """
+        return self.shards[document_shard(filename, len(self.shards))]
+
+    def scatter(self, method, *args, **kwargs):
+        """
+        Call the same method on every shard concurrently.
+
+        :param method: Name of the Indexer method.
+        :return: List of per-shard results, ordered by shard number.
+        """
+        futures = [self.pool.submit(shard.call, method, *args, **kwargs) for shard in self.shards]
+        return [future.result() for future in futures]
+
+    def suggest_corrections(self, term, limit=5):
+        """
+        Suggest corrections for a term using the vocabulary of every shard.
+
+        :param term: Term to correct.
+        :param limit: Maximum number of suggestions.
+        :return: List of (word, edit distance, frequency) tuples, best first.
+        """
+        return self._merge_suggestions(self.scatter("suggest_corrections", term, limit), limit)
+
+    def correct_query(self, query):
+        """
+        Replace query terms unknown to every shard with their closest known word.
+
+        All terms are sent to each shard in a single request. A term known to any shard
+        comes back from it at distance 0 and is kept as is.
+
+        :param query: Search query string.
+        :return: The corrected query string (lowercased).
+        """
+        terms = query.lower().split()
+        candidates = sorted({term for term in terms if len(term) >= 3 and term.isalpha()})
+        if not candidates:
+            return ' '.join(terms)
+
+        per_shard = self.scatter("suggest_term_corrections", candidates, 1)
+        corrections = {}
+        for term in candidates:
+            suggestions = self._merge_suggestions([shard_suggestions[term] for shard_suggestions in per_shard], 1)
+            corrections[term] = suggestions[0][0] if suggestions else term
+        return ' '.join(corrections.get(term, term) for term in terms)
+
+    def search(self, query, filename=None, correct=True, top_k=None):
+        """
+        Search every shard and merge the results.
+
+        :param query: Search query string.
+        :param filename: Optional filename to restrict the search to a specific PDF.
+        :param correct: Whether to correct misspelled terms against the global vocabulary first.
+        :param top_k: Optional maximum number of results.
+        :return: List of search results with filenames and match percentages.
+        :raises FileNotFoundError: If the specified file is not found.
+        """
+        if correct:
+            query = self.correct_query(query)
+        if filename:
+            return self.owner(filename).call("search", query, filename, correct=False)[:top_k]
+        results = [result for shard_results in self.scatter("search", query, None, correct=False)
+                   for result in shard_results]
+        return self._merge_ranked(results, "match_percentage", top_k)
+
+    def alternative_search_results(self, query, top_k=None):
+        """
+        Collect alternative search results from every shard.
+
+        :param query: Search query string.
+        :param top_k: Optional maximum number of results.
+        :return: List of alternative search results with filenames and match percentages.
+        """
+        results = [result for shard_results in self.scatter("alternative_search_results", query)
+                   for result in shard_results]
+        return self._merge_ranked(results, "match_percentage", top_k)
+
+    def autocomplete(self, query, correct=True):
+        """
+        Merge autocomplete suggestions from every shard by their combined n-gram counts.
+
+        :param query: Autocomplete query string.
+        :param correct: Whether to retry with a spelling-corrected query when nothing matches.
+        :return: List of autocomplete suggestions, most frequent first.
+        """
+        counts = self._autocomplete_counts(query)
+        if not counts and correct:
+            corrected = self.correct_query(query)
+            if corrected != query.lower():
+                counts = self._autocomplete_counts(corrected)
+        return sorted(counts, key=lambda suggestion: (-counts[suggestion], suggestion))
+
+    def _autocomplete_counts(self, query):
+        counts = Counter()
+        for shard_counts in self.scatter("autocomplete_counts", query):
+            counts.update(shard_counts)
+        return counts
+
+    def similar_documents(self, filename, top_k=5):
+        """
+        Find the documents most similar to a given document across all shards.
+
+        Each shard weights the reference document with its own IDF, so scores
+        are an approximation of a single global TF-IDF matrix.
+
+        :param filename: Name of the reference document.
+        :param top_k: Number of similar documents to return.
+        :return: List of similar documents with filenames and cosine similarity scores.
+        :raises FileNotFoundError: If the specified file has not been indexed.
+        """
+        term_counts = self.owner(filename).call("document_term_counts", filename)
+        results = [result for shard_results in
+                   self.scatter("similar_to_term_counts", term_counts, top_k, exclude=(filename,))
+                   for result in shard_results]
+        return self._merge_ranked(results, "score", top_k)
+
+    def metrics_snapshots(self):
+        """
+        Collect the metrics of every shard server, skipping shards that cannot be reached.
+
+        :return: List of ([("shard", shard number)], registry snapshot) pairs for render_metrics.
+        """
+        futures = [self.pool.submit(shard.call, "metrics_snapshot") for shard in self.shards]
+        snapshots = []
+        for shard_id, future in enumerate(futures):
+            try:
+                snapshots.append(([("shard", str(shard_id))], future.result()))
+            except Exception as e:
+                logging.error(f"Error collecting metrics from shard {shard_id}: {str(e)}")
+        return snapshots
+
+    @staticmethod
+    def _merge_suggestions(shard_suggestions, limit):
+        merged = {}
+        for suggestions in shard_suggestions:
+            for word, distance, frequency in suggestions:
+                _, total = merged.get(word, (distance, 0))
+                merged[word] = (distance, total + frequency)
+        ranked = sorted(merged.items(), key=lambda item: (item[1][0], -item[1][1], item[0]))
+        return [(word, distance, frequency) for word, (distance, frequency) in ranked[:limit]]
+
+    @staticmethod
+    def _merge_ranked(results, key, top_k):
+        if top_k is None:
+            return sorted(results, key=lambda x: x[key], reverse=True)
+        return heapq.nlargest(top_k, results, key=lambda x: x[key])
+
+    def close(self):
+        """
+        Close shard connections and stop any shard processes started by this coordinator.
+        """
+        for shard in self.shards:
+            shard.close()
+        for process in self.processes:
+            process.terminate()
+            process.join()
+        self.pool.shutdown(wait=False)
+
+
+def shard_authkey():
+    """
+    Read the shared secret for shard connections from OWLEYES_SHARD_AUTHKEY.
+
+    :return: The secret as bytes.
+    :raises RuntimeError: If the variable is not set.
+    """
+    authkey = os.environ.get(AUTHKEY_VARIABLE)
+    if not authkey:
+        raise RuntimeError(f"{AUTHKEY_VARIABLE} must be set to a shared secret to serve or connect to shards")
+    return authkey.encode("utf-8")
+
+
+def serve_shard(pdf_directory, shard_id, num_shards, address=("127.0.0.1", 0), authkey=None, ready=None):
+    """
+    Build one shard's index and serve queries for it until the process is stopped.
+
+    :param pdf_directory: Directory where the PDF files are stored.
+    :param shard_id: Shard to build and serve.
+    :param num_shards: Total number of shards.
+    :param address: (host, port) to listen on; port 0 picks a free port.
+    :param authkey: Shared secret clients must present; defaults to OWLEYES_SHARD_AUTHKEY.
+    :param ready: Optional connection that receives the bound address once the index is built.
+    :raises RuntimeError: If no secret is given and OWLEYES_SHARD_AUTHKEY is not set.
+    """
+    authkey = authkey or shard_authkey()
+    indexer = Indexer(pdf_directory, shard_id=shard_id, num_shards=num_shards)
+    with Listener(tuple(address), authkey=authkey) as listener:
+        logging.info(f"Shard {shard_id}/{num_shards} listening on {listener.address}")
+        if ready is not None:
+            ready.send(listener.address)
+            ready.close()
+        while True:
+            try:
+                connection = listener.accept()
+            except (OSError, multiprocessing.AuthenticationError) as e:
+                logging.error(f"Rejected shard connection: {str(e)}")
+                continue
+            threading.Thread(target=_handle_connection, args=(indexer, connection), daemon=True).start()
+
+
+def _handle_connection(indexer, connection):
+    """
+    Answer requests from one coordinator connection until it is closed.
+
+    :param indexer: Indexer holding this shard's documents.
+    :param connection: Accepted client connection.
+    """
+    with connection:
+        while True:
+            try:
+                method, args, kwargs = connection.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if method not in SHARD_METHODS:
+                    raise ValueError(f"Unsupported shard method: {method}")
+                connection.send(("ok", getattr(indexer, method)(*args, **kwargs)))
+            except Exception as e:
+                connection.send(("error", e))
+
+
+def start_local_shards(pdf_directory, num_shards, authkey=None, address=("127.0.0.1", 0)):
+    """
+    Start one shard server process per shard on this machine and connect to them.
+
+    The processes belong to the caller, so each uvicorn worker that calls this gets its
+    own set of shards. To share one set between workers, serve them once with
+    ``python -m autosearch.sharding`` and connect to them instead.
+
+    :param pdf_directory: Directory where the PDF files are stored.
+    :param num_shards: Number of shards to partition the corpus into.
+    :param authkey: Shared secret used between the coordinator and shards; a random one by default.
+    :param address: (host, port) of shard 0; shard N listens on port + N, or on a free port if port is 0.
+    :return: A ShardCoordinator that stops the processes when closed.
+    """
+    authkey = authkey or os.urandom(32)
+    context = multiprocessing.get_context("spawn")
+    processes, pipes = [], []
+    host, port = address
+    for shard_id in range(num_shards):
+        receiver, sender = context.Pipe(duplex=False)
+        shard_address = (host, port + shard_id if port else 0)
+        process = context.Process(target=serve_shard, daemon=True,
+                                  args=(pdf_directory, shard_id, num_shards),
+                                  kwargs={"address": shard_address, "authkey": authkey, "ready": sender})
+        process.start()
+        sender.close()
+        processes.append(process)
+        pipes.append(receiver)
+
+    addresses = [receiver.recv() for receiver in pipes]
+    shards = [RemoteShard(address, authkey) for address in addresses]
+    return ShardCoordinator(shards, processes)
+
+
+def parse_addresses(value):
+    """
+    Parse a comma-separated list of host:port shard addresses.
+
+    :param value: String such as "10.0.0.1:7001,10.0.0.2:7001".
+    :return: List of (host, port) tuples.
+    """
+    addresses = []
+    for item in value.split(","):
+        host, port = item.strip().rsplit(":", 1)
+        addresses.append((host, int(port)))
+    return addresses
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve shards of the OwlEyes search index.")
+    parser.add_argument("pdf_directory")
+    parser.add_argument("--shard-id", type=int,
+                        help="Shard to serve; without it every shard is served from this machine")
+    parser.add_argument("--num-shards", type=int, required=True)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7001, help="Port of the shard, or of shard 0 with all shards")
+    arguments = parser.parse_args()
+    if arguments.shard_id is not None:
+        serve_shard(arguments.pdf_directory, arguments.shard_id, arguments.num_shards,
+                    address=(arguments.host, arguments.port))
+    else:
+        coordinator = start_local_shards(arguments.pdf_directory, arguments.num_shards, authkey=shard_authkey(),
+                                         address=(arguments.host, arguments.port))
+        addresses = ",".join(f"{host}:{port}" for host, port in (shard.address for shard in coordinator.shards))
+        print(f"OWLEYES_SHARD_ADDRESSES={addresses}", flush=True)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # Stop the shards with the parent
+        try:
+            for process in coordinator.processes:
+                process.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            coordinator.close()
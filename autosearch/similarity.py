@@ -0,0 +1,163 @@
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+from monitoring.metrics import record_cache, time_stage
+
+
+class SimilarityIndex:
+    """
+    Sparse TF-IDF document-term matrix for "more like this" queries.
+
+    Raw term counts are stored per document as they are indexed, so adding a
+    document never re-tokenizes the others. The weighted, L2-normalized matrix is
+    rebuilt lazily from those counts the next time a query needs it.
+    """
+
+    def __init__(self, stopwords=()):
+        """
+        Initialize an empty similarity index.
+
+        :param stopwords: Terms that are never added to the matrix.
+        """
+        self.stopwords = set(stopwords)
+        self.vocabulary = {}
+        self.documents = {}
+        self.filenames = []
+        self.positions = {}
+        self._matrix = None
+        self._idf = None
+
+    def __contains__(self, filename):
+        return filename in self.documents
+
+    def add_document(self, filename, words):
+        """
+        Add (or replace) a document's term counts.
+
+        :param filename: Name of the document.
+        :param words: List of tokens extracted from the document.
+        """
+        counts = Counter(word for word in words if word not in self.stopwords and not word.isdigit())
+        columns = np.fromiter((self.vocabulary.setdefault(term, len(self.vocabulary)) for term in counts),
+                              dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        order = np.argsort(columns)
+
+        if filename not in self.documents:
+            self.positions[filename] = len(self.filenames)
+            self.filenames.append(filename)
+        self.documents[filename] = (columns[order], values[order])
+        self._matrix = None
+
+    def matrix(self):
+        """
+        Return the TF-IDF matrix, rebuilding it if documents were added since the last call.
+
+        :return: CSR matrix with one L2-normalized row per document.
+        """
+        record_cache("tfidf_matrix", self._matrix is not None)
+        if self._matrix is None:
+            with time_stage("similarity", "tfidf_build"):
+                self._matrix = self._build_matrix()
+        return self._matrix
+
+    def _build_matrix(self):
+        """
+        Build the sublinear-TF, smoothed-IDF weighted matrix from the stored counts.
+
+        :return: CSR matrix with one L2-normalized row per document.
+        """
+        rows = [self.documents[filename] for filename in self.filenames]
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(columns) for columns, _ in rows])
+        indices = np.concatenate([columns for columns, _ in rows]) if rows else np.zeros(0, dtype=np.int64)
+        data = np.concatenate([values for _, values in rows]) if rows else np.zeros(0)
+
+        counts = sparse.csr_matrix((data, indices, indptr), shape=(len(rows), len(self.vocabulary)))
+        document_frequency = np.bincount(counts.indices, minlength=counts.shape[1])
+        idf = np.log((1 + counts.shape[0]) / (1 + document_frequency)) + 1
+        self._idf = idf
+
+        weights = counts.copy()
+        weights.data = (1 + np.log(weights.data)) * idf[weights.indices]
+        norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.diags(1 / norms) @ weights
+
+    def most_similar(self, filename, top_k=5):
+        """
+        Find the documents most similar to a given document by cosine similarity.
+
+        :param filename: Name of the reference document.
+        :param top_k: Number of similar documents to return.
+        :return: List of dictionaries with filenames and similarity scores, most similar first.
+        :raises KeyError: If the document has not been indexed.
+        """
+        if filename not in self.documents:
+            raise KeyError(filename)
+
+        matrix = self.matrix()
+        position = self.positions[filename]
+        scores = (matrix @ matrix[position].T).toarray().ravel()
+        scores[position] = -np.inf
+        return self._top_k(scores, top_k)
+
+    def document_counts(self, filename):
+        """
+        Return the raw term counts stored for a document.
+
+        :param filename: Name of the document.
+        :return: Dictionary mapping terms to their counts.
+        :raises KeyError: If the document has not been indexed.
+        """
+        columns, values = self.documents[filename]
+        terms = list(self.vocabulary)
+        return {terms[column]: int(value) for column, value in zip(columns, values)}
+
+    def most_similar_to_counts(self, term_counts, top_k=5, exclude=()):
+        """
+        Find the documents most similar to an arbitrary bag of term counts.
+
+        The counts are weighted with this index's IDF, so scores from indexes over
+        different document sets are comparable only approximately.
+
+        :param term_counts: Dictionary mapping terms to their counts.
+        :param top_k: Number of similar documents to return.
+        :param exclude: Filenames to leave out of the results.
+        :return: List of dictionaries with filenames and similarity scores, most similar first.
+        """
+        if not self.filenames:
+            return []
+        matrix = self.matrix()
+        known = [(self.vocabulary[term], count) for term, count in term_counts.items()
+                 if term in self.vocabulary and count > 0]
+        if not known:
+            return []
+
+        columns = np.array([column for column, _ in known], dtype=np.int64)
+        values = (1 + np.log(np.array([count for _, count in known], dtype=np.float64))) * self._idf[columns]
+        vector = np.zeros(matrix.shape[1])
+        vector[columns] = values / np.linalg.norm(values)
+        scores = matrix @ vector
+        for filename in exclude:
+            if filename in self.positions:
+                scores[self.positions[filename]] = -np.inf
+        return self._top_k(scores, top_k)
+
+    def _top_k(self, scores, top_k):
+        """
+        Select the highest-scoring documents, leaving out those that share no terms with the query.
+
+        :param scores: Array of cosine similarities, one per document.
+        :param top_k: Number of documents to return.
+        :return: List of dictionaries with filenames and similarity scores, most similar first.
+        """
+        positive = np.flatnonzero(scores > 0)
+        top_k = min(top_k, len(positive))
+        if top_k <= 0:
+            return []
+        candidates = positive[np.argpartition(-scores[positive], top_k - 1)[:top_k]]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [{"file_name": self.filenames[i], "score": float(scores[i])} for i in ranked]
@@ -0,0 +1,142 @@
+from collections import defaultdict, Counter
+
+
+class SymSpellIndex:
+    """
+    Symmetric-delete (SymSpell) index over a vocabulary for fast typo correction.
+
+    Every word is stored under all the strings obtained by deleting up to
+    ``max_edit_distance`` characters from its prefix. A lookup generates the same
+    deletions for the query and only verifies the few words that share one, so
+    corrections never scan the vocabulary.
+    """
+
+    def __init__(self, max_edit_distance=2, prefix_length=7):
+        """
+        Initialize an empty index.
+
+        :param max_edit_distance: Largest edit distance a correction may have.
+        :param prefix_length: Number of leading characters used to generate deletions.
+        """
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+        self.deletes = defaultdict(set)
+        self.frequencies = Counter()
+
+    def __contains__(self, word):
+        return word in self.frequencies
+
+    def __len__(self):
+        return len(self.frequencies)
+
+    def add_word(self, word, count=1):
+        """
+        Add a word to the index, or increase its frequency if it is already known.
+
+        :param word: Lowercase vocabulary word.
+        :param count: Number of occurrences to add.
+        """
+        if word in self.frequencies:
+            self.frequencies[word] += count
+            return
+        self.frequencies[word] = count
+        for delete in self._deletes(word[:self.prefix_length]):
+            self.deletes[delete].add(word)
+
+    def lookup(self, term, max_edit_distance=None, limit=5):
+        """
+        Find vocabulary words within the edit distance of a term.
+
+        :param term: Term to correct.
+        :param max_edit_distance: Optional override of the index edit distance.
+        :param limit: Maximum number of suggestions to return.
+        :return: List of (word, distance, frequency) tuples, closest and most frequent first.
+        """
+        if max_edit_distance is None:
+            max_edit_distance = self.max_edit_distance
+        max_edit_distance = min(max_edit_distance, self.max_edit_distance)
+        term = term.lower()
+
+        if term in self.frequencies:
+            return [(term, 0, self.frequencies[term])]
+
+        candidates = set()
+        for delete in self._deletes(term[:self.prefix_length], max_edit_distance):
+            candidates.update(self.deletes.get(delete, ()))
+
+        suggestions = []
+        for word in candidates:
+            if abs(len(word) - len(term)) > max_edit_distance:
+                continue
+            distance = edit_distance(term, word, max_edit_distance)
+            if distance <= max_edit_distance:
+                suggestions.append((word, distance, self.frequencies[word]))
+
+        suggestions.sort(key=lambda s: (s[1], -s[2], s[0]))
+        return suggestions[:limit]
+
+    def correct(self, term):
+        """
+        Return the best correction for a term, or the term itself if none is found.
+
+        :param term: Term to correct.
+        :return: The corrected term.
+        """
+        suggestions = self.lookup(term, limit=1)
+        return suggestions[0][0] if suggestions else term
+
+    def _deletes(self, word, max_edit_distance=None):
+        """
+        Generate the word and every string reachable from it by deleting characters.
+
+        :param word: Word (or word prefix) to generate deletions for.
+        :param max_edit_distance: Maximum number of characters to delete.
+        :return: Set of deletion strings, including the word itself.
+        """
+        if max_edit_distance is None:
+            max_edit_distance = self.max_edit_distance
+        results = {word}
+        frontier = {word}
+        for _ in range(max_edit_distance):
+            next_frontier = set()
+            for candidate in frontier:
+                if len(candidate) <= 1:
+                    continue
+                for i in range(len(candidate)):
+                    next_frontier.add(candidate[:i] + candidate[i + 1:])
+            next_frontier -= results
+            results |= next_frontier
+            frontier = next_frontier
+        return results
+
+
+def edit_distance(source, target, max_distance):
+    """
+    Compute the optimal string alignment (Damerau-Levenshtein) distance between two strings.
+
+    :param source: First string.
+    :param target: Second string.
+    :param max_distance: Distance at which to stop early.
+    :return: The distance, or ``max_distance + 1`` if it exceeds ``max_distance``.
+    """
+    if source == target:
+        return 0
+    if abs(len(source) - len(target)) > max_distance:
+        return max_distance + 1
+
+    previous_previous = None
+    previous = list(range(len(target) + 1))
+    for i in range(1, len(source) + 1):
+        current = [i] + [0] * len(target)
+        row_min = current[0]
+        for j in range(1, len(target) + 1):
+            cost = 0 if source[i - 1] == target[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1 and source[i - 1] == target[j - 2]
+                    and source[i - 2] == target[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+            row_min = min(row_min, current[j])
+        if row_min > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1] if previous[-1] <= max_distance else max_distance + 1
@@ -0,0 +1,64 @@
+import argparse
+import json
+import logging
+import sys
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.runner import STAGES, compare_to_baseline, format_results, load_baseline, run_benchmarks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark indexing, search and key-term filtering.")
+    parser.add_argument("--documents", type=int, default=10, help="Number of synthetic contracts (10 to 100000)")
+    parser.add_argument("--min-pages", type=int, default=1)
+    parser.add_argument("--max-pages", type=int, default=5, help="Maximum pages per contract (up to 200)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", default="bench_corpus")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--warmups", type=int, default=1)
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--baseline", default="benchmarks/baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--time-tolerance", type=float, default=0.2)
+    parser.add_argument("--rss-tolerance", type=float, default=0.2)
+    parser.add_argument("--output", help="Also write the results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    if not 10 <= args.documents <= 100000:
+        parser.error("--documents must be between 10 and 100000")
+    if not 1 <= args.min_pages <= args.max_pages <= 200:
+        parser.error("page counts must satisfy 1 <= --min-pages <= --max-pages <= 200")
+
+    generate_corpus(args.corpus_dir, args.documents, args.min_pages, args.max_pages, args.seed)
+    results = run_benchmarks(args.corpus_dir, args.stages, args.warmups, args.repetitions)
+    results["config"] = {"documents": args.documents, "min_pages": args.min_pages,
+                         "max_pages": args.max_pages, "seed": args.seed}
+
+    baseline = None if args.save_baseline else load_baseline(args.baseline)
+    print(format_results(results, baseline))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one.")
+        return 0
+    regressions = compare_to_baseline(results, baseline, args.time_tolerance, args.rss_tolerance)
+    if regressions:
+        print("\nREGRESSIONS:", file=sys.stderr)
+        for regression in regressions:
+            print(f"  {regression}", file=sys.stderr)
+        return 1
+    print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    sys.exit(main())
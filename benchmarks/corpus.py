@@ -0,0 +1,145 @@
+import json
+import logging
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+
+PARTIES = [
+    "Acme Holdings Ltd", "Northwind Traders", "Blue Harbor Properties", "Granite Peak Capital",
+    "Silverline Logistics", "Juniper Health Services", "Orchard Lane Estates", "Redwood Analytics Inc",
+    "Harborview Manufacturing", "Meridian Consulting Group", "Summit Ridge Developments", "Cobalt Energy Partners",
+]
+PEOPLE = [
+    "John Smith", "Maria Garcia", "Ahmed Khan", "Li Wei", "Fatima Malik", "James O'Connor",
+    "Sara Johansson", "David Cohen", "Priya Nair", "Kwame Mensah", "Elena Rossi", "Hiroshi Tanaka",
+]
+DEAL_TYPES = [
+    "Commercial Lease Agreement", "Employment Contract", "Residential Purchase Agreement",
+    "Master Services Agreement", "Non-Disclosure Agreement", "Loan Agreement", "Supply Agreement",
+]
+CLAUSES = [
+    "Definitions", "Term", "Rent", "Payment", "Indemnification", "Confidentiality", "Termination",
+    "Insurance", "Governing Law", "Dispute Resolution", "Assignment", "Force Majeure", "Notices",
+    "Maintenance and Repairs", "Security Deposit", "Limitation of Liability", "Warranties", "Severability",
+]
+WORDS = (
+    "the tenant landlord lessee lessor employer employee purchaser seller premises property party parties "
+    "shall hereby agree agrees covenant warrant represent obligation obligations payment rent deposit "
+    "notice written days month months year annual fee fees interest default breach remedy remedies "
+    "termination renewal extension option insurance liability indemnify indemnity damages losses claims "
+    "costs expenses taxes utilities maintenance repair repairs alteration improvements consent approval "
+    "assignment sublet subletting confidential information disclosure compensation salary benefits leave "
+    "probation duties performance governing law jurisdiction arbitration dispute settlement court provision "
+    "provisions effective date commencement expiry schedule annexure clause section subsection accordance "
+    "reasonable prior thereof herein hereunder whereas pursuant including without limitation respect"
+).split()
+
+
+def _sentence(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 24))]
+    if rng.random() < 0.3:
+        words.insert(rng.randrange(len(words)), rng.choice(PARTIES))
+    if rng.random() < 0.15:
+        words.insert(rng.randrange(len(words)), rng.choice(PEOPLE))
+    return " ".join(words).capitalize() + "."
+
+
+def generate_contract_pages(seed, pages):
+    """
+    Generate the page texts of one synthetic contract.
+
+    :param seed: Seed that fully determines the contract's content.
+    :param pages: Number of pages to generate.
+    :return: List of page texts.
+    """
+    rng = random.Random(seed)
+    deal_type = rng.choice(DEAL_TYPES)
+    first, second = rng.sample(PARTIES, 2)
+    effective = f"{rng.randint(2000, 2030)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+
+    page_texts = []
+    clause_number = 1
+    for page_number in range(pages):
+        lines = []
+        if page_number == 0:
+            lines += [deal_type.upper(), "",
+                      f"This {deal_type} is made on {effective} between {first} and {second}.", ""]
+        while len(lines) < 30:
+            lines.append(f"{clause_number}. {rng.choice(CLAUSES)}")
+            lines += [_sentence(rng) for _ in range(rng.randint(2, 5))]
+            lines.append("")
+            clause_number += 1
+        if page_number == pages - 1:
+            witness = rng.choice(PEOPLE)
+            lines += ["Signed by the parties:", f"For {first}: {rng.choice(PEOPLE)}",
+                      f"For {second}: {rng.choice(PEOPLE)}", f"Witness: {witness}"]
+        page_texts.append("\n".join(lines))
+    return page_texts
+
+
+def write_contract(path, seed, pages):
+    """
+    Write one synthetic contract PDF.
+
+    :param path: Output path of the PDF.
+    :param seed: Seed that fully determines the contract's content.
+    :param pages: Number of pages to generate.
+    """
+    doc = fitz.open()
+    for text in generate_contract_pages(seed, pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, page.rect.width - 50, page.rect.height - 50), text, fontsize=8)
+    doc.save(path, garbage=1, deflate=True)
+    doc.close()
+
+
+def _write_contract_args(args):
+    write_contract(*args)
+
+
+def generate_corpus(output_dir, num_documents=10, min_pages=1, max_pages=5, seed=0, workers=None):
+    """
+    Generate a deterministic corpus of synthetic contract PDFs.
+
+    The same arguments always produce the same documents. A manifest records the
+    configuration, so an existing corpus with the same configuration is reused.
+
+    :param output_dir: Directory to write the PDFs to.
+    :param num_documents: Number of documents to generate.
+    :param min_pages: Minimum number of pages per document.
+    :param max_pages: Maximum number of pages per document.
+    :param seed: Corpus seed.
+    :param workers: Number of processes used to write the PDFs.
+    :return: List of generated file names.
+    """
+    config = {"num_documents": num_documents, "min_pages": min_pages, "max_pages": max_pages, "seed": seed}
+    # Kept next to the corpus directory, which the indexers expect to hold only PDFs.
+    manifest_path = os.path.normpath(output_dir) + ".manifest.json"
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest["config"] == config:
+            logging.info(f"Reusing corpus in {output_dir}")
+            return manifest["files"]
+    os.makedirs(output_dir, exist_ok=True)
+    for filename in os.listdir(output_dir):
+        if filename.endswith(".pdf"):
+            os.remove(os.path.join(output_dir, filename))
+
+    rng = random.Random(seed)
+    tasks = []
+    files = []
+    for i in range(num_documents):
+        filename = f"contract-{i:06d}.pdf"
+        tasks.append((os.path.join(output_dir, filename), f"{seed}-{i}", rng.randint(min_pages, max_pages)))
+        files.append(filename)
+
+    logging.info(f"Generating {num_documents} contracts in {output_dir}")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(_write_contract_args, tasks, chunksize=max(1, len(tasks) // 256)))
+
+    with open(manifest_path, "w") as f:
+        json.dump({"config": config, "files": files}, f)
+    return files
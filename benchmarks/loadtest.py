@@ -0,0 +1,277 @@
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.corpus import CLAUSES, PARTIES, PEOPLE, WORDS, generate_corpus
+
+DEFAULT_MIX = {"search": 30, "autocomplete": 40, "advanced_search": 10, "pdf": 15, "key_terms": 5}
+
+
+def make_request(endpoint, rng, files):
+    """
+    Build a random request for an endpoint.
+
+    :param endpoint: Name of the endpoint in the traffic mix.
+    :param rng: Random number generator.
+    :param files: PDF file names available on the server.
+    :return: Tuple of (path, query parameters).
+    """
+    if endpoint == "search":
+        return "/search", {"query": " ".join(rng.sample(WORDS, rng.randint(1, 2)))}
+    if endpoint == "autocomplete":
+        word = rng.choice(WORDS)
+        return "/autocomplete", {"query": word[:rng.randint(2, max(2, len(word)))]}
+    if endpoint == "advanced_search":
+        return "/advanced_search", {"parties": [rng.choice(PARTIES)], "clauses": [rng.choice(CLAUSES)],
+                                    "mentionedNames": [rng.choice(PEOPLE)]}
+    if endpoint == "pdf":
+        return f"/pdfs/{rng.choice(files)}", {}
+    if endpoint == "key_terms":
+        return f"/key_terms/{rng.choice(files)}", {}
+    raise ValueError(f"Unknown endpoint in mix: {endpoint}")
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of a sorted list.
+
+    :param sorted_values: Values sorted in ascending order.
+    :param fraction: Percentile as a fraction between 0 and 1.
+    :return: The percentile value, or None for an empty list.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_load(base_url, mix, rate, duration, files, clients=4, max_in_flight=256, seed=0, timeout=30.0):
+    """
+    Replay a random request mix against the server at a fixed arrival rate.
+
+    Requests are sent open-loop: each one is scheduled at its arrival time
+    regardless of how many are still in flight, and its latency is measured from
+    that scheduled time, so a slow server cannot hide queueing delay.
+
+    :param base_url: Base URL of the server.
+    :param mix: Dictionary mapping endpoint names to relative weights.
+    :param rate: Target requests per second.
+    :param duration: Length of the run in seconds.
+    :param files: PDF file names available on the server.
+    :param clients: Number of async HTTP clients (connection pools) to spread requests over.
+    :param max_in_flight: Maximum number of outstanding requests; later arrivals wait for a slot.
+    :param seed: Seed for the request sequence.
+    :param timeout: Per-request timeout in seconds.
+    :return: Dictionary mapping endpoint names to lists of (latency seconds, status or None) samples, and the elapsed time.
+    """
+    rng = random.Random(seed)
+    endpoints = list(mix)
+    weights = [mix[endpoint] for endpoint in endpoints]
+    samples = defaultdict(list)
+    slots = asyncio.Semaphore(max_in_flight)
+    limits = httpx.Limits(max_connections=max(1, max_in_flight // clients))
+    pool = [httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) for _ in range(clients)]
+
+    async def send(client, endpoint, path, params, scheduled):
+        async with slots:
+            try:
+                response = await client.get(path, params=params)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = None
+        samples[endpoint].append((time.perf_counter() - scheduled, status))
+
+    tasks = []
+    start = time.perf_counter()
+    total = int(rate * duration)
+    try:
+        for i in range(total):
+            scheduled = start + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            endpoint = rng.choices(endpoints, weights)[0]
+            path, params = make_request(endpoint, rng, files)
+            tasks.append(asyncio.create_task(send(pool[i % clients], endpoint, path, params, scheduled)))
+        await asyncio.gather(*tasks)
+    finally:
+        for client in pool:
+            await client.aclose()
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples, elapsed):
+    """
+    Compute per-endpoint latency percentiles, throughput and error rate.
+
+    Requests that failed, timed out or returned a 5xx status count as errors.
+
+    :param samples: Samples returned by run_load.
+    :param elapsed: Elapsed wall-clock time of the run in seconds.
+    :return: Dictionary mapping endpoint names (and "all") to their statistics.
+    """
+    report = {}
+    everything = []
+    for endpoint, endpoint_samples in sorted(samples.items()):
+        everything.extend(endpoint_samples)
+        report[endpoint] = _statistics(endpoint_samples, elapsed)
+    report["all"] = _statistics(everything, elapsed)
+    return report
+
+
+def _statistics(samples, elapsed):
+    latencies = sorted(latency for latency, _ in samples)
+    errors = sum(1 for _, status in samples if status is None or status >= 500)
+    return {
+        "requests": len(samples),
+        "throughput_rps": len(samples) / elapsed if elapsed else 0.0,
+        "error_rate": errors / len(samples) if samples else 0.0,
+        "p50_ms": _milliseconds(percentile(latencies, 0.50)),
+        "p95_ms": _milliseconds(percentile(latencies, 0.95)),
+        "p99_ms": _milliseconds(percentile(latencies, 0.99)),
+    }
+
+
+def _milliseconds(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+def format_report(report):
+    """
+    Format a load-test report as a text table.
+
+    :param report: Report returned by summarize.
+    :return: The table as a string.
+    """
+    lines = [f"{'endpoint':<18}{'requests':>10}{'rps':>10}{'errors':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"]
+    for endpoint, stats in report.items():
+        lines.append(f"{endpoint:<18}{stats['requests']:>10}{stats['throughput_rps']:>10.1f}"
+                     f"{stats['error_rate']:>9.1%}{stats['p50_ms'] or 0:>10.1f}{stats['p95_ms'] or 0:>10.1f}"
+                     f"{stats['p99_ms'] or 0:>10.1f}")
+    return "\n".join(lines)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(corpus_dir, port, workers=1, startup_timeout=600.0, extra_env=None):
+    """
+    Boot the API with lightweight models against a corpus and wait until it answers.
+
+    OWLEYES_LIGHTWEIGHT_MODELS=1 replaces the NLTK data and the NER model with offline
+    stubs (see keyterm.lightweight), so /key_terms still runs NER windowing and batching.
+
+    :param corpus_dir: Directory containing the corpus PDFs.
+    :param port: Port to listen on.
+    :param workers: Number of uvicorn worker processes.
+    :param startup_timeout: Seconds to wait for the server to come up (index build included).
+    :param extra_env: Additional environment variables for the server.
+    :return: The server process.
+    :raises RuntimeError: If the server exits or does not answer in time, with the end of its error output.
+    """
+    env = dict(os.environ, OWLEYES_PDF_DIR=corpus_dir, OWLEYES_LIGHTWEIGHT_MODELS="1", **(extra_env or {}))
+    errors = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "chatbot.app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=errors,
+    )
+
+    def startup_error(message):
+        errors.seek(0)
+        output = errors.read().decode("utf-8", "replace").strip().splitlines()
+        errors.close()
+        return RuntimeError("\n".join([message] + output[-20:]))
+
+    deadline = time.monotonic() + startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise startup_error(f"Server exited with status {process.returncode} during startup:")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1.0).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    process.wait()
+    raise startup_error("Server did not start in time:")
+
+
+def parse_mix(value):
+    """
+    Parse a traffic mix such as "search=30,autocomplete=40,pdf=30".
+
+    :param value: Comma-separated endpoint=weight pairs.
+    :return: Dictionary mapping endpoint names to weights.
+    """
+    mix = {}
+    for item in value.split(","):
+        endpoint, weight = item.split("=")
+        mix[endpoint.strip()] = float(weight)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the OwlEyes API with a mixed request workload.")
+    parser.add_argument("--documents", type=int, default=50)
+    parser.add_argument("--max-pages", type=int, default=5)
+    parser.add_argument("--corpus-dir", default="bench_corpus")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="Endpoint weights, e.g. search=30,autocomplete=40,advanced_search=10,pdf=15,key_terms=5")
+    parser.add_argument("--rate", type=float, default=50.0, help="Target requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--max-in-flight", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--url", help="Load-test an already running server instead of booting one")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    files = generate_corpus(args.corpus_dir, args.documents, 1, args.max_pages)
+    server = None
+    base_url = args.url
+    if base_url is None:
+        port = _free_port()
+        logging.info(f"Starting server on port {port}")
+        server = start_server(os.path.abspath(args.corpus_dir), port, args.workers)
+        base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        samples, elapsed = asyncio.run(run_load(base_url, args.mix, args.rate, args.duration, files,
+                                                args.clients, args.max_in_flight, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = summarize(samples, elapsed)
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": {"rate": args.rate, "duration": args.duration, "mix": args.mix,
+                                  "documents": args.documents, "workers": args.workers},
+                       "report": report}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    sys.exit(main())
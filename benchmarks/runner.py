@@ -0,0 +1,181 @@
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import time
+
+import fitz
+
+# Queries drawn from the synthetic corpus vocabulary (see benchmarks.corpus).
+SEARCH_QUERIES = ["tenant", "indemnify landlord", "termination notice", "governing law", "security deposit"]
+AUTOCOMPLETE_QUERIES = ["te", "land", "indemn", "terminat", "gov"]
+ADVANCED_SEARCH_TERMS = [["Acme Holdings Ltd"], ["Force Majeure", "Arbitration"], ["Maria Garcia"]]
+
+
+def _indexer(corpus_dir):
+    from autosearch.indexer import Indexer
+    return Indexer(corpus_dir)
+
+
+def _stage_build_index(corpus_dir):
+    from autosearch.indexer import Indexer
+    return lambda: Indexer(corpus_dir)
+
+
+def _stage_search(corpus_dir):
+    indexer = _indexer(corpus_dir)
+    return lambda: [indexer.search(query) for query in SEARCH_QUERIES]
+
+
+def _stage_autocomplete(corpus_dir):
+    indexer = _indexer(corpus_dir)
+    return lambda: [indexer.autocomplete(query) for query in AUTOCOMPLETE_QUERIES]
+
+
+def _stage_advanced_search(corpus_dir):
+    from advancedsearch.advanced_search import AdvancedSearch
+    advanced_search = AdvancedSearch(corpus_dir)
+    return lambda: [advanced_search.search(terms) for terms in ADVANCED_SEARCH_TERMS]
+
+
+def _stage_filter_terms(corpus_dir):
+    from keyterm.chunked_yake import get_yake_extractor
+    from keyterm.preprocess import TermExtractionHandler
+    handler = TermExtractionHandler(load_model=False)
+    filename = sorted(f for f in os.listdir(corpus_dir) if f.endswith(".pdf"))[0]
+    with fitz.open(os.path.join(corpus_dir, filename)) as doc:
+        text = "\n".join(page.get_text() for page in doc)
+    terms = {kw.lower() for kw, _ in get_yake_extractor().extract_keywords(text)}
+    return lambda: handler.filter_terms(terms, text)
+
+
+# Each stage takes the corpus directory, does its setup and returns the operation to time.
+STAGES = {
+    "build_index": _stage_build_index,
+    "search": _stage_search,
+    "autocomplete": _stage_autocomplete,
+    "advanced_search": _stage_advanced_search,
+    "filter_terms": _stage_filter_terms,
+}
+
+
+def _run_stage(stage, corpus_dir, warmups, repetitions):
+    """
+    Time one stage. Runs in a fresh process so its peak RSS is measured in isolation.
+
+    :param stage: Name of the stage.
+    :param corpus_dir: Directory containing the corpus PDFs.
+    :param warmups: Number of untimed runs.
+    :param repetitions: Number of timed runs.
+    :return: Dictionary with the timings (seconds) and peak RSS (KiB).
+    """
+    logging.disable(logging.INFO)  # Indexer logs every indexed term at INFO
+    operation = STAGES[stage](corpus_dir)
+    for _ in range(warmups):
+        operation()
+    timings = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - start)
+    return {"timings": timings, "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+def run_benchmarks(corpus_dir, stages=None, warmups=1, repetitions=5):
+    """
+    Run the benchmark stages against a corpus, each in its own process.
+
+    :param corpus_dir: Directory containing the corpus PDFs.
+    :param stages: Names of the stages to run; all stages by default.
+    :param warmups: Number of untimed runs per stage.
+    :param repetitions: Number of timed runs per stage.
+    :return: Dictionary with the environment and per-stage statistics.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for stage in stages or STAGES:
+        logging.info(f"Running stage {stage}")
+        with context.Pool(1) as pool:
+            measured = pool.apply(_run_stage, (stage, corpus_dir, warmups, repetitions))
+        timings = sorted(measured["timings"])
+        results[stage] = {
+            "median_s": statistics.median(timings),
+            "mean_s": statistics.fmean(timings),
+            "min_s": timings[0],
+            "max_s": timings[-1],
+            "stdev_s": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+            "repetitions": len(timings),
+            "peak_rss_kb": measured["peak_rss_kb"],
+        }
+    return {
+        "environment": {"python": platform.python_version(), "machine": platform.machine(),
+                        "cpu_count": os.cpu_count()},
+        "stages": results,
+    }
+
+
+def compare_to_baseline(results, baseline, time_tolerance=0.2, rss_tolerance=0.2):
+    """
+    Compare benchmark results with a stored baseline.
+
+    A stage regresses if its median time or peak RSS exceeds the baseline by more
+    than the tolerance. Stages missing from either side are ignored. Results for a
+    different corpus configuration are not comparable and count as a failure.
+
+    :param results: Results returned by run_benchmarks.
+    :param baseline: Baseline results in the same format.
+    :param time_tolerance: Allowed relative increase of the median time.
+    :param rss_tolerance: Allowed relative increase of the peak RSS.
+    :return: List of human-readable regression descriptions.
+    """
+    if results.get("config") != baseline.get("config"):
+        return [f"corpus configuration {results.get('config')} does not match the baseline's "
+                f"{baseline.get('config')}; rerun with the baseline's options or record a new baseline"]
+
+    regressions = []
+    for stage, current in results["stages"].items():
+        reference = baseline["stages"].get(stage)
+        if reference is None:
+            continue
+        if current["median_s"] > reference["median_s"] * (1 + time_tolerance):
+            regressions.append(f"{stage}: median {current['median_s']:.4f}s vs baseline "
+                               f"{reference['median_s']:.4f}s (+{current['median_s'] / reference['median_s'] - 1:.0%})")
+        if current["peak_rss_kb"] > reference["peak_rss_kb"] * (1 + rss_tolerance):
+            regressions.append(f"{stage}: peak RSS {current['peak_rss_kb']} KiB vs baseline "
+                               f"{reference['peak_rss_kb']} KiB")
+    return regressions
+
+
+def format_results(results, baseline=None):
+    """
+    Format benchmark results as a text table.
+
+    :param results: Results returned by run_benchmarks.
+    :param baseline: Optional baseline to show relative changes against.
+    :return: The table as a string.
+    """
+    lines = [f"{'stage':<18}{'median (s)':>12}{'min (s)':>12}{'max (s)':>12}{'peak RSS (MiB)':>16}{'vs baseline':>14}"]
+    for stage, stats in results["stages"].items():
+        change = ""
+        reference = (baseline or {}).get("stages", {}).get(stage)
+        if reference:
+            change = f"{stats['median_s'] / reference['median_s'] - 1:+.1%}"
+        lines.append(f"{stage:<18}{stats['median_s']:>12.4f}{stats['min_s']:>12.4f}{stats['max_s']:>12.4f}"
+                     f"{stats['peak_rss_kb'] / 1024:>16.1f}{change:>14}")
+    return "\n".join(lines)
+
+
+def load_baseline(path):
+    """
+    Load a baseline JSON file.
+
+    :param path: Path to the baseline file.
+    :return: The baseline, or None if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
@@ -1,26 +1,48 @@
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Optional, Dict, Any
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, Response
 from pydantic import BaseModel
 from transformers import pipeline, TFGPT2LMHeadModel, AutoTokenizer
 from advancedsearch.advanced_search import AdvancedSearch
 from autosearch.indexer import Indexer
+from autosearch.sharding import ShardCoordinator, parse_addresses, start_local_shards
 from chatbot.pdf_viewer import extract_text_from_pdf
+from chatbot.previews import MEDIA_TYPES, PagePreviewer, PreviewCache
+from chatbot.profiling import ProfiledRoute, RequestProfiler, format_collapsed
+from chatbot.store import SQLiteStore
+from keyterm.lightweight import LIGHTWEIGHT_MODELS
 from keyterm.preprocess import TermExtractionHandler
+from monitoring.metrics import CONTENT_TYPE, HTTP_REQUEST_DURATION, render_metrics
 
 app = FastAPI()
-
-
-indexer = Indexer(pdf_directory="pdf")
-advancedsearch = AdvancedSearch(pdf_directory="pdf")
-term_extraction_handler = TermExtractionHandler()
-
-# Initialize the Hugging Face transformers pipeline with TensorFlow model
-tokenizer = AutoTokenizer.from_pretrained("gpt2")
-model = TFGPT2LMHeadModel.from_pretrained("gpt2")
-nlp = pipeline("text-generation", model=model, tokenizer=tokenizer)
+# Routes record which thread runs their endpoint, so request profiles can be told apart
+app.router.route_class = ProfiledRoute
+
+PDF_DIRECTORY = os.environ.get("OWLEYES_PDF_DIR", "pdf")
+
+# The search index is either built in-process, partitioned across local shard processes
+# (OWLEYES_NUM_SHARDS), or served by shard servers started separately (OWLEYES_SHARD_ADDRESSES).
+# Local shard processes are started by every worker that imports this module, so
+# OWLEYES_NUM_SHARDS is meant for a single worker; multi-worker deployments connect instead.
+if os.environ.get("OWLEYES_SHARD_ADDRESSES"):
+    indexer = ShardCoordinator.connect(parse_addresses(os.environ["OWLEYES_SHARD_ADDRESSES"]))
+elif int(os.environ.get("OWLEYES_NUM_SHARDS", "1")) > 1:
+    indexer = start_local_shards(PDF_DIRECTORY, int(os.environ["OWLEYES_NUM_SHARDS"]))
+else:
+    indexer = Indexer(pdf_directory=PDF_DIRECTORY)
+advancedsearch = AdvancedSearch(pdf_directory=PDF_DIRECTORY)
+term_extraction_handler = TermExtractionHandler(yake_workers=int(os.environ.get("OWLEYES_YAKE_WORKERS", "0")))
+
+# Initialize the Hugging Face transformers pipeline with TensorFlow model (skipped with lightweight models)
+if not LIGHTWEIGHT_MODELS:
+    tokenizer = AutoTokenizer.from_pretrained("gpt2")
+    model = TFGPT2LMHeadModel.from_pretrained("gpt2")
+    nlp = pipeline("text-generation", model=model, tokenizer=tokenizer)
 
 
 class Annotation(BaseModel):
@@ -29,6 +51,10 @@ class Annotation(BaseModel):
     coordinates: Dict[str, Any]
 
 
+class KeyTermsBatchRequest(BaseModel):
+    file_names: List[str]
+
+
 class Feedback(BaseModel):
     query: str
     response: str
@@ -36,9 +62,107 @@ class Feedback(BaseModel):
     comments: Optional[str] = None
 
 
-# In-memory database for annotations and feedback
-annotations_db = {}
-feedback_db = []
+# Durable database for annotations and feedback, shared by all workers
+store = SQLiteStore(os.environ.get("OWLEYES_DB_PATH", "owleyes.db"))
+
+
+# Rendered page images, cached on disk by content hash, page and scale
+previewer = PagePreviewer(PDF_DIRECTORY, PreviewCache(
+    os.environ.get("OWLEYES_PREVIEW_CACHE_DIR", ".preview_cache"),
+    max_bytes=int(os.environ.get("OWLEYES_PREVIEW_CACHE_MB", "512")) * 1024 * 1024,
+))
+
+
+@app.on_event("startup")
+def prerender_previews():
+    """
+    Pre-render the first pages of the most recently added documents in the background.
+    """
+    documents = int(os.environ.get("OWLEYES_PRERENDER_DOCS", "20"))
+    if documents > 0:
+        threading.Thread(target=previewer.prerender, name="prerender-previews", daemon=True, kwargs={
+            "documents": documents, "pages": int(os.environ.get("OWLEYES_PRERENDER_PAGES", "1"))}).start()
+
+
+@app.on_event("shutdown")
+def close_store():
+    """
+    Flush pending feedback and close the annotations and feedback store.
+    """
+    store.close()
+
+
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    """
+    Record the latency of every request by method, route template and status.
+    """
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, method=request.method,
+                                      route=route.path if route else "unmatched", status=status)
+
+
+# Opt-in profiling: X-OwlEyes-Profile: 1 plus the admin token profiles a single request, and
+# OWLEYES_SLOW_REQUEST_MS keeps the profiles of slow requests for the /admin/profiles endpoints.
+request_profiler = RequestProfiler.from_environment()
+app.middleware("http")(request_profiler)
+
+
+def require_admin(x_owleyes_admin_token: Optional[str] = Header(None)):
+    """
+    Reject requests without the admin token. Admin endpoints are hidden when no token is configured.
+    """
+    if not request_profiler.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not request_profiler.is_admin(x_owleyes_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+def list_profiles():
+    """
+    List the captured slow-request profiles, newest first.
+
+    Returns:
+        dict: The latency threshold and profile summaries.
+    """
+    return {"slow_request_ms": request_profiler.slow_request_ms, "profiles": request_profiler.list_profiles()}
+
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def get_profile(profile_id: int):
+    """
+    Retrieve a captured slow-request profile as collapsed stacks.
+
+    Args:
+        profile_id (int): The id of the profile.
+
+    Returns:
+        PlainTextResponse: Collapsed stacks ("frame;frame count" per line) for flamegraph tools.
+    """
+    profile = request_profiler.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(format_collapsed(profile["stacks"]))
+
+
+@app.get("/metrics")
+def metrics():
+    """
+    Expose per-stage timings, cache hit counts, index size and request latencies.
+
+    Returns:
+        Response: The metrics of this worker process and of every shard server in the Prometheus text format.
+    """
+    shard_metrics = indexer.metrics_snapshots() if isinstance(indexer, ShardCoordinator) else ()
+    return Response(render_metrics(shard_metrics), media_type=CONTENT_TYPE)
 
 
 @app.get("/")
@@ -61,7 +185,7 @@ def get_pdfs():
         JSONResponse: A list of PDF file names.
     """
     try:
-        pdf_list = os.listdir("pdf")
+        pdf_list = os.listdir(PDF_DIRECTORY)
         return JSONResponse(content=pdf_list)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -79,7 +203,7 @@ def get_pdf(file_name: str):
         FileResponse: The requested PDF file.
     """
     try:
-        pdf_path = os.path.join("pdf", file_name)
+        pdf_path = os.path.join(PDF_DIRECTORY, file_name)
         if not os.path.exists(pdf_path):
             raise HTTPException(status_code=404, detail="PDF not found")
 
@@ -88,23 +212,61 @@ def get_pdf(file_name: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/pdfs/{file_name}/pages/{page_number}/preview")
+def get_page_preview(file_name: str, page_number: int, request: Request, scale: float = Query(1.0, gt=0, le=4),
+                     format: str = Query("png", pattern="^(png|webp)$")):
+    """
+    Render a page of a PDF file as an image.
+
+    Args:
+        file_name (str): The name of the PDF file.
+        page_number (int): The 1-based page number.
+        scale (float): Zoom factor; 1.0 renders at 72 dpi.
+        format (str): Image format, "png" or "webp".
+
+    Returns:
+        Response: The rendered page, or 304 if the client's cached copy is current.
+    """
+    try:
+        # The key includes the content hash, so a given URL only changes when the PDF does
+        key = previewer.cache_key(file_name, page_number, scale, format)
+        headers = {"ETag": f'"{key}"', "Cache-Control": "public, max-age=86400"}
+        if request.headers.get("if-none-match") == headers["ETag"]:
+            return Response(status_code=304, headers=headers)
+        image, _ = previewer.preview(file_name, page_number, scale, format)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="PDF not found")
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return Response(content=image, media_type=MEDIA_TYPES[format], headers=headers)
+
+
 @app.get("/search")
 def search_documents(query: str = Query(..., min_length=1), file_name: Optional[str] = None):
     """
-    Search for documents that match the query.
+    Search for documents that match the query. Misspelled terms are replaced with
+    their closest indexed word before searching.
 
     Args:
         query (str): The search query.
         file_name (Optional[str]): The name of the file to search within (if specified).
 
     Returns:
-        dict: The search query and results.
+        dict: The search query, results and the corrected query (if any term was corrected).
     """
     try:
-        results = indexer.search(query, file_name)
+        corrected_query = indexer.correct_query(query)
+        results = indexer.search(corrected_query, file_name, correct=False)
         if not results:
             raise HTTPException(status_code=404, detail="No documents found matching the query.")
-        return {"query": query, "results": results}
+        response = {"query": query, "results": results}
+        if corrected_query != query.lower():
+            response["corrected_query"] = corrected_query
+        return response
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -114,7 +276,8 @@ def search_documents(query: str = Query(..., min_length=1), file_name: Optional[
 @app.get("/autocomplete")
 def autocomplete(query: str = Query(..., min_length=1)):
     """
-    Provide autocomplete suggestions for the given query.
+    Provide autocomplete suggestions for the given query. If nothing matches, the
+    query is spell-corrected and retried.
 
     Args:
         query (str): The search query.
@@ -162,6 +325,27 @@ def alternative_search(query: str = Query(..., min_length=1), page: int = Query(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/similar/{file_name}")
+def similar_documents(file_name: str, top_k: int = Query(5, ge=1, le=100)):
+    """
+    Find the documents most similar to a given PDF file.
+
+    Args:
+        file_name (str): The name of the reference PDF file.
+        top_k (int): The number of similar documents to return.
+
+    Returns:
+        dict: The file name and its most similar documents with similarity scores.
+    """
+    try:
+        similar = indexer.similar_documents(file_name, top_k)
+        return {"file_name": file_name, "similar_documents": similar}
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/advanced_search")
 def advanced_search_documents(
         beforeDate: Optional[str] = Query(None,
@@ -232,7 +416,7 @@ def get_key_terms(file_name: str):
         dict: The file name and extracted key terms.
     """
     try:
-        pdf_path = os.path.join("pdf", file_name)
+        pdf_path = os.path.join(PDF_DIRECTORY, file_name)
         if not os.path.exists(pdf_path):
             raise HTTPException(status_code=404, detail="PDF not found")
 
@@ -243,6 +427,50 @@ def get_key_terms(file_name: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/key_terms/batch")
+def get_key_terms_batch(request: KeyTermsBatchRequest):
+    """
+    Extract and rank key terms from several PDF files at once.
+
+    The files are processed concurrently so their NER windows are batched together.
+
+    Args:
+        request (KeyTermsBatchRequest): The names of the PDF files.
+
+    Returns:
+        dict: The extracted key terms per file, the files that were not found, and the files that failed.
+    """
+    file_names = list(dict.fromkeys(request.file_names))
+    if len(file_names) > 100:
+        raise HTTPException(status_code=400, detail="At most 100 files can be processed per request")
+
+    # Names come from the request body, so anything but a plain PDF file name in
+    # PDF_DIRECTORY (paths, "..", directories) is reported as not found
+    found = [file_name for file_name in file_names
+             if os.path.basename(file_name) == file_name and file_name.endswith(".pdf")
+             and os.path.isfile(os.path.join(PDF_DIRECTORY, file_name))]
+    not_found = [file_name for file_name in file_names if file_name not in found]
+
+    def extract(file_name):
+        try:
+            text = extract_text_from_pdf(os.path.join(PDF_DIRECTORY, file_name))
+            return {"file_name": file_name, "key_terms": term_extraction_handler.extract_and_rank_key_terms(text)}
+        except HTTPException as e:
+            return {"file_name": file_name, "error": e.detail}
+        except Exception as e:
+            return {"file_name": file_name, "error": str(e)}
+
+    results = []
+    if found:
+        with ThreadPoolExecutor(max_workers=min(len(found), 8)) as executor:
+            results = list(executor.map(extract, found))
+    return {
+        "results": [result for result in results if "error" not in result],
+        "not_found": not_found,
+        "errors": [result for result in results if "error" in result],
+    }
+
+
 @app.post("/annotations/{file_name}")
 def save_annotation(file_name: str, annotation: Annotation):
     """
@@ -255,26 +483,44 @@ def save_annotation(file_name: str, annotation: Annotation):
     Returns:
         dict: A success message.
     """
-    if file_name not in annotations_db:
-        annotations_db[file_name] = []
-    annotations_db[file_name].append(annotation.dict())
-    return {"message": "Annotation saved successfully"}
+    try:
+        store.add_annotation(file_name, annotation.dict())
+        return {"message": "Annotation saved successfully"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/annotations/{file_name}")
-def get_annotations(file_name: str):
+def get_annotations(file_name: str, page_number: Optional[int] = Query(None, ge=1),
+                    page: int = Query(1, ge=1), page_size: int = Query(100, ge=1, le=1000)):
     """
-    Retrieve annotations for a PDF file.
+    Retrieve annotations for a PDF file with pagination.
 
     Args:
         file_name (str): The name of the PDF file.
+        page_number (Optional[int]): The PDF page to restrict the annotations to (if specified).
+        page (int): The page number for pagination.
+        page_size (int): The number of annotations per page.
 
     Returns:
-        dict: The file name and its annotations.
+        dict: The file name, its paginated annotations, and the total number of annotations.
     """
-    if file_name not in annotations_db:
+    try:
+        total_annotations = store.count_annotations(file_name, page_number)
+        annotations = store.get_annotations(file_name, page_number, limit=page_size,
+                                            offset=(page - 1) * page_size)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if total_annotations == 0:
         raise HTTPException(status_code=404, detail="No annotations found for this file")
-    return {"file_name": file_name, "annotations": annotations_db[file_name]}
+    return {
+        "file_name": file_name,
+        "annotations": annotations,
+        "total_annotations": total_annotations,
+        "page": page,
+        "page_size": page_size
+    }
 
 
 @app.post("/feedback")
@@ -288,8 +534,11 @@ def save_feedback(feedback: Feedback):
     Returns:
         dict: A success message.
     """
-    feedback_db.append(feedback.dict())
-    return {"message": "Feedback saved successfully"}
+    try:
+        store.add_feedback(feedback.dict())
+        return {"message": "Feedback saved successfully"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 if __name__ == "__app__":
@@ -2,6 +2,7 @@ import os
 import fitz
 from fastapi import HTTPException
 from fastapi.responses import Response
+from monitoring.metrics import timed
 
 
 def list_all_pdfs():
@@ -42,6 +43,7 @@ def serve_pdf(file_name: str, as_text: bool = False):
     return Response(content, media_type="application/pdf")
 
 
+@timed("pdf_viewer", "pdf_extraction")
 def extract_text_from_pdf(pdf_path: str) -> str:
     """
     Extract text content from a PDF file.
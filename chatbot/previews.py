@@ -0,0 +1,290 @@
+import hashlib
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+import fitz
+
+from monitoring.metrics import record_cache, time_stage
+
+try:
+    import fcntl
+except ImportError:  # Not on POSIX: the cache is only coordinated within one process
+    fcntl = None
+
+try:
+    import PIL  # noqa: F401  (fitz uses Pillow to encode WebP)
+    WEBP_SUPPORTED = True
+except ImportError:
+    WEBP_SUPPORTED = False
+
+MEDIA_TYPES = {"png": "image/png", "webp": "image/webp"}
+
+
+@contextmanager
+def file_lock(path: str, blocking: bool = True):
+    """
+    Hold an exclusive lock on a file, shared by all processes using the same path.
+
+    :param path: Path of the lock file; created if needed.
+    :param blocking: Whether to wait for the lock.
+    :return: Context manager yielding whether the lock was acquired.
+    """
+    with open(path, "a") as f:
+        if fcntl is None:
+            yield True
+            return
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class PreviewCache:
+    """
+    Size-bounded on-disk LRU cache of rendered page images.
+
+    The directory can be shared by several uvicorn workers. Recency is kept in file
+    modification times, and the total size of the cache is kept in a small file that
+    every worker updates under a lock file, so the size limit applies to the cache as
+    a whole rather than per worker. The directory is only scanned when that total goes
+    over the limit, and eviction then frees a tenth of the cache so that the next scan
+    is many writes away.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024):
+        """
+        :param cache_dir: Directory holding the cached images.
+        :param max_bytes: Total size above which the least recently used images are deleted.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.low_water_bytes = max_bytes * 9 // 10
+        self.lock_path = os.path.join(cache_dir, ".lock")
+        self.size_path = os.path.join(cache_dir, ".size")
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Read a cached image and mark it as recently used.
+
+        :param key: Cache key.
+        :return: The image bytes, or None on a miss.
+        """
+        path = os.path.join(self.cache_dir, key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:  # Also when another worker evicts it between the read and utime
+            record_cache("page_preview", False)
+            return None
+        record_cache("page_preview", True)
+        return data
+
+    def put(self, key: str, data: bytes):
+        """
+        Store an image and evict the least recently used ones if the cache is over its size limit.
+
+        :param key: Cache key.
+        :param data: Image bytes.
+        """
+        path = os.path.join(self.cache_dir, key)
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(data)
+        try:
+            replaced_bytes = os.stat(path).st_size  # Another worker rendered the same page
+        except FileNotFoundError:
+            replaced_bytes = 0
+        os.replace(temporary_path, path)
+
+        with self._lock, file_lock(self.lock_path):
+            total_bytes = self._read_total()
+            if total_bytes is None or total_bytes + len(data) - replaced_bytes > self.max_bytes:
+                total_bytes = self._evict()
+            else:
+                total_bytes += len(data) - replaced_bytes
+            self._write_total(total_bytes)
+
+    def _read_total(self) -> Optional[int]:
+        try:
+            with open(self.size_path) as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):  # First write, or a worker died while writing it
+            return None
+
+    def _write_total(self, total_bytes: int):
+        with open(self.size_path, "w") as f:
+            f.write(str(total_bytes))
+
+    def _evict(self) -> int:
+        """
+        Scan the directory and, if it is over the size limit, delete the least recently
+        used images until it fits the low-water mark. The most recent image is always kept.
+
+        :return: The total size of the images left in the cache.
+        """
+        entries = []
+        total_bytes = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.startswith(".") or entry.name.endswith(".tmp"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, entry.path, stat.st_size))
+            total_bytes += stat.st_size
+        if total_bytes <= self.max_bytes:
+            return total_bytes
+
+        entries.sort()
+        for _, path, size in entries[:-1]:
+            if total_bytes <= self.low_water_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+        return total_bytes
+
+
+class PagePreviewer:
+    """
+    Renders PDF pages to images through a PreviewCache.
+    """
+
+    def __init__(self, pdf_directory: str, cache: PreviewCache):
+        """
+        :param pdf_directory: Directory where the PDF files are stored.
+        :param cache: Cache for rendered images.
+        """
+        self.pdf_directory = pdf_directory
+        self.cache = cache
+        self._hashes = {}
+        self._hashes_lock = threading.Lock()
+
+    def content_hash(self, pdf_path: str) -> str:
+        """
+        Hash a PDF's content, reusing the hash while its size and modification time are unchanged.
+
+        :param pdf_path: Path to the PDF file.
+        :return: Hex SHA-256 digest of the file.
+        """
+        stat = os.stat(pdf_path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        with self._hashes_lock:
+            cached = self._hashes.get(pdf_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        digest = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        with self._hashes_lock:
+            self._hashes[pdf_path] = (signature, digest.hexdigest())
+        return digest.hexdigest()
+
+    def cache_key(self, file_name: str, page_number: int, scale: float = 1.0, image_format: str = "png") -> str:
+        """
+        Return the cache key of a rendered page without rendering or reading it.
+
+        :param file_name: The name of the PDF file.
+        :param page_number: 1-based page number.
+        :param scale: Zoom factor; 1.0 renders at 72 dpi.
+        :param image_format: "png" or "webp".
+        :return: The key, which changes only when the PDF does (usable as an ETag).
+        :raises FileNotFoundError: If the PDF does not exist.
+        :raises ValueError: If the image format is not supported.
+        """
+        if image_format not in MEDIA_TYPES or (image_format == "webp" and not WEBP_SUPPORTED):
+            raise ValueError(f"Unsupported preview format: {image_format}")
+        pdf_path = os.path.join(self.pdf_directory, file_name)
+        if not os.path.exists(pdf_path):
+            raise FileNotFoundError(f"File {file_name} not found in directory.")
+        return f"{self.content_hash(pdf_path)}-p{page_number}-s{scale:g}.{image_format}"
+
+    def preview(self, file_name: str, page_number: int, scale: float = 1.0,
+                image_format: str = "png") -> Tuple[bytes, str]:
+        """
+        Return a page rendered as an image, from the cache if possible.
+
+        :param file_name: The name of the PDF file.
+        :param page_number: 1-based page number.
+        :param scale: Zoom factor; 1.0 renders at 72 dpi.
+        :param image_format: "png" or "webp".
+        :return: Tuple of the image bytes and its cache key.
+        :raises FileNotFoundError: If the PDF does not exist.
+        :raises IndexError: If the page number is out of range.
+        :raises ValueError: If the image format is not supported.
+        """
+        key = self.cache_key(file_name, page_number, scale, image_format)
+        data = self.cache.get(key)
+        if data is None:
+            data = render_page(os.path.join(self.pdf_directory, file_name), page_number, scale, image_format)
+            self.cache.put(key, data)
+        return data, key
+
+    def prerender(self, documents: int = 20, pages: int = 1, scale: float = 1.0, image_format: str = "png"):
+        """
+        Render the first pages of the most recently modified documents into the cache.
+
+        Only one process pre-renders at a time; workers that start while another one is
+        pre-rendering skip it, since they share the cache.
+
+        :param documents: Number of documents to pre-render.
+        :param pages: Number of leading pages per document.
+        :param scale: Zoom factor.
+        :param image_format: "png" or "webp".
+        """
+        with file_lock(os.path.join(self.cache.cache_dir, ".prerender.lock"), blocking=False) as acquired:
+            if not acquired:
+                logging.info("Previews are being pre-rendered by another worker")
+                return
+            self._prerender(documents, pages, scale, image_format)
+
+    def _prerender(self, documents, pages, scale, image_format):
+        pdf_files = [f for f in os.listdir(self.pdf_directory) if f.endswith(".pdf")]
+        pdf_files.sort(key=lambda f: os.path.getmtime(os.path.join(self.pdf_directory, f)), reverse=True)
+        for file_name in pdf_files[:documents]:
+            for page_number in range(1, pages + 1):
+                try:
+                    self.preview(file_name, page_number, scale, image_format)
+                except IndexError:
+                    break
+                except Exception as e:
+                    logging.error(f"Error pre-rendering {file_name} page {page_number}: {str(e)}")
+                    break
+        logging.info(f"Pre-rendered previews for {min(documents, len(pdf_files))} documents")
+
+
+def render_page(pdf_path: str, page_number: int, scale: float, image_format: str) -> bytes:
+    """
+    Render one PDF page to an image.
+
+    :param pdf_path: Path to the PDF file.
+    :param page_number: 1-based page number.
+    :param scale: Zoom factor; 1.0 renders at 72 dpi.
+    :param image_format: "png" or "webp".
+    :return: The encoded image.
+    :raises IndexError: If the page number is out of range.
+    """
+    with time_stage("previews", "render"):
+        with fitz.open(pdf_path) as doc:
+            if not 1 <= page_number <= doc.page_count:
+                raise IndexError(f"Page {page_number} out of range (1-{doc.page_count})")
+            pixmap = doc[page_number - 1].get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+            if image_format == "webp":
+                return pixmap.pil_tobytes(format="WEBP", quality=80)
+            return pixmap.tobytes("png")
@@ -0,0 +1,346 @@
+import asyncio
+import contextvars
+import functools
+import hmac
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRoute
+
+PROFILE_HEADER = "X-OwlEyes-Profile"
+ADMIN_TOKEN_HEADER = "X-OwlEyes-Admin-Token"
+
+
+class RequestTrace:
+    """
+    Where a profiled request's endpoint ran: (thread id, start, end, code) intervals.
+
+    For async endpoints the code object of the endpoint is kept too, because the event
+    loop thread runs other requests' tasks while the endpoint is suspended.
+    """
+
+    def __init__(self, sampler):
+        """
+        :param sampler: Sampler that must sample the endpoint's thread while it runs.
+        """
+        self.sampler = sampler
+        self.intervals = []
+
+
+# Trace of the request being handled; set by RequestProfiler and inherited by the endpoint's
+# task and worker thread.
+_current_trace = contextvars.ContextVar("owleyes_request_trace", default=None)
+
+
+def _code_key(code):
+    return code.co_filename, code.co_name, code.co_firstlineno
+
+
+def trace_endpoint(endpoint):
+    """
+    Wrap an endpoint so that, in profiled requests, the thread running it is sampled and recorded.
+
+    :param endpoint: Sync or async endpoint function.
+    :return: A wrapper with the same signature.
+    """
+    if asyncio.iscoroutinefunction(endpoint):
+        marker = _code_key(endpoint.__code__)
+
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            trace = _current_trace.get()
+            if trace is None:
+                return await endpoint(*args, **kwargs)
+            thread_id, start = trace.sampler.watch()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                trace.intervals.append((thread_id, start, trace.sampler.unwatch(thread_id), marker))
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        trace = _current_trace.get()
+        if trace is None:
+            return endpoint(*args, **kwargs)
+        thread_id, start = trace.sampler.watch()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            trace.intervals.append((thread_id, start, trace.sampler.unwatch(thread_id), None))
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """
+    APIRoute whose endpoint records the thread it runs on, so profiles only keep that request's samples.
+    """
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, trace_endpoint(endpoint), **kwargs)
+
+
+class StackSampler:
+    """
+    Samples the Python stacks of the threads running profiled endpoints.
+
+    Each sample is (timestamp, thread id, stack), with the stack stored root first as
+    (filename, function name, first line number) tuples. Samples older than the start
+    of the oldest request still being profiled are discarded.
+    """
+
+    def __init__(self, interval: float = 0.01, fast_interval: float = 0.001):
+        """
+        :param interval: Seconds between samples for slow-request capture.
+        :param fast_interval: Seconds between samples while an on-demand profile is running.
+        """
+        self.interval = interval
+        self.fast_interval = fast_interval
+        self._lock = threading.Lock()
+        self._samples = deque()
+        self._requests = Counter()  # perf_counter() start times of the requests being profiled
+        self._threads = Counter()  # Threads currently running a profiled endpoint
+        self._fast = 0
+        self._wake = threading.Event()
+        self._thread = None
+
+    def begin(self, start: float, fast: bool = False):
+        """
+        Start profiling a request.
+
+        :param start: perf_counter() value at the start of the request.
+        :param fast: Whether to sample at the on-demand rate until the request ends.
+        """
+        with self._lock:
+            self._requests[start] += 1
+            self._fast += fast
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+
+    def end(self, start: float, fast: bool = False):
+        """
+        Stop profiling a request and drop the samples no other request can need.
+
+        :param start: The start time passed to begin().
+        :param fast: Whether the request was sampled at the on-demand rate.
+        """
+        with self._lock:
+            self._requests[start] -= 1
+            if not self._requests[start]:
+                del self._requests[start]
+            self._fast -= fast
+            self._trim()
+
+    def watch(self):
+        """
+        Start sampling the calling thread.
+
+        :return: Tuple of the thread id and the perf_counter() start time.
+        """
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._threads[thread_id] += 1
+            self._wake.set()
+        return thread_id, time.perf_counter()
+
+    def unwatch(self, thread_id: int) -> float:
+        """
+        Stop sampling a thread.
+
+        :param thread_id: Thread id returned by watch().
+        :return: perf_counter() end time.
+        """
+        end = time.perf_counter()
+        with self._lock:
+            self._threads[thread_id] -= 1
+            if not self._threads[thread_id]:
+                del self._threads[thread_id]
+            if not self._threads:
+                self._wake.clear()
+        return end
+
+    def _trim(self):
+        if not self._requests:
+            self._samples.clear()
+            return
+        cutoff = min(self._requests)
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            with self._lock:
+                threads = set(self._threads)
+            now = time.perf_counter()
+            sampled = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id not in threads:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_code_key(frame.f_code))
+                    frame = frame.f_back
+                sampled.append((now, thread_id, tuple(reversed(stack))))
+
+            with self._lock:
+                if self._requests:
+                    self._samples.extend(sampled)
+                    self._trim()
+                fast = self._fast > 0
+            time.sleep(self.fast_interval if fast else self.interval)
+
+    def collapse(self, intervals) -> Dict[str, int]:
+        """
+        Aggregate a request's samples into collapsed stacks.
+
+        :param intervals: The request's RequestTrace intervals.
+        :return: Dictionary mapping "frame;frame;frame" stacks (root first) to sample counts.
+        """
+        with self._lock:
+            samples = list(self._samples)
+        stacks = Counter()
+        for timestamp, thread_id, stack in samples:
+            for interval_thread, start, end, marker in intervals:
+                if (thread_id == interval_thread and start <= timestamp <= end
+                        and (marker is None or marker in stack)):
+                    stacks[";".join(f"{name} ({os.path.basename(filename)}:{line})"
+                                    for filename, name, line in stack)] += 1
+                    break
+        return dict(stacks)
+
+
+def format_collapsed(stacks: Dict[str, int]) -> str:
+    """
+    Format collapsed stacks in the flamegraph.pl / speedscope input format.
+
+    :param stacks: Dictionary mapping collapsed stacks to sample counts.
+    :return: One "stack count" line per stack, most frequent first.
+    """
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items(), key=lambda item: -item[1]))
+
+
+class RequestProfiler:
+    """
+    HTTP middleware for on-demand and slow-request profiling.
+
+    A request that sends the profile header together with a valid admin token is
+    sampled at a high rate, and its response is replaced by the collapsed-stack
+    profile. When a slow-request threshold is set, every request is sampled at a low
+    rate and the profiles of requests slower than the threshold are kept in a bounded
+    ring buffer for the admin endpoints.
+
+    Only the threads running the request's endpoint are sampled, so routes must be
+    created with ProfiledRoute.
+    """
+
+    def __init__(self, admin_token: Optional[str] = None, slow_request_ms: float = 0.0, buffer_size: int = 50,
+                 interval_ms: float = 10.0):
+        """
+        :param admin_token: Token that authorizes profiling; profiling is disabled without it.
+        :param slow_request_ms: Latency above which profiles are captured; 0 disables capture.
+        :param buffer_size: Number of slow-request profiles kept.
+        :param interval_ms: Sampling interval for slow-request capture, in milliseconds.
+        """
+        self.admin_token = admin_token
+        self.slow_request_ms = slow_request_ms
+        self.sampler = StackSampler(interval=interval_ms / 1000)
+        self.profiles = deque(maxlen=buffer_size)
+        self._ids = itertools.count(1)
+
+    @classmethod
+    def from_environment(cls):
+        """
+        Configure the profiler from OWLEYES_ADMIN_TOKEN, OWLEYES_SLOW_REQUEST_MS,
+        OWLEYES_PROFILE_BUFFER and OWLEYES_PROFILE_INTERVAL_MS.
+
+        :return: A RequestProfiler.
+        """
+        return cls(
+            admin_token=os.environ.get("OWLEYES_ADMIN_TOKEN") or None,
+            slow_request_ms=float(os.environ.get("OWLEYES_SLOW_REQUEST_MS", "0")),
+            buffer_size=int(os.environ.get("OWLEYES_PROFILE_BUFFER", "50")),
+            interval_ms=float(os.environ.get("OWLEYES_PROFILE_INTERVAL_MS", "10")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.admin_token is not None
+
+    def is_admin(self, token: Optional[str]) -> bool:
+        """
+        Check an admin token in constant time.
+
+        :param token: Token sent by the client.
+        :return: True if profiling is enabled and the token matches.
+        """
+        return self.enabled and token is not None and hmac.compare_digest(token, self.admin_token)
+
+    async def __call__(self, request: Request, call_next):
+        on_demand = request.headers.get(PROFILE_HEADER) == "1" and self.is_admin(
+            request.headers.get(ADMIN_TOKEN_HEADER))
+        capture = self.enabled and self.slow_request_ms > 0
+        if not on_demand and not capture:
+            return await call_next(request)
+
+        start = time.perf_counter()
+        trace = RequestTrace(self.sampler)
+        self.sampler.begin(start, fast=on_demand)
+        token = _current_trace.set(trace)  # Inherited by the endpoint's task and worker thread
+        try:
+            response = await call_next(request)
+            duration_ms = (time.perf_counter() - start) * 1000
+            if on_demand or duration_ms >= self.slow_request_ms:
+                stacks = self.sampler.collapse(trace.intervals)
+        finally:
+            _current_trace.reset(token)
+            self.sampler.end(start, fast=on_demand)
+
+        if on_demand:
+            return PlainTextResponse(format_collapsed(stacks), headers={
+                "X-OwlEyes-Profiled-Status": str(response.status_code),
+                "X-OwlEyes-Profile-Duration-Ms": f"{duration_ms:.1f}",
+            })
+        if duration_ms >= self.slow_request_ms:
+            self.profiles.append({
+                "id": next(self._ids),
+                "method": request.method,
+                "path": request.url.path,
+                "query": request.url.query,
+                "status": response.status_code,
+                "duration_ms": round(duration_ms, 1),
+                "captured_at": datetime.now(timezone.utc).isoformat(),
+                "samples": sum(stacks.values()),
+                "stacks": stacks,
+            })
+        return response
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """
+        Summaries of the captured slow-request profiles, newest first.
+
+        :return: List of profile summaries without their stacks.
+        """
+        return [{key: value for key, value in profile.items() if key != "stacks"}
+                for profile in reversed(self.profiles)]
+
+    def get_profile(self, profile_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Look up a captured profile.
+
+        :param profile_id: Id of the profile.
+        :return: The profile, or None if it is not (or no longer) in the buffer.
+        """
+        for profile in self.profiles:
+            if profile["id"] == profile_id:
+                return profile
+        return None
@@ -0,0 +1,243 @@
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS annotations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_name TEXT NOT NULL,
+    page_number INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    coordinates TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_annotations_file_page ON annotations (file_name, page_number);
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    query TEXT NOT NULL,
+    response TEXT NOT NULL,
+    rating INTEGER NOT NULL,
+    comments TEXT,
+    created_at TEXT NOT NULL
+);
+"""
+
+
+class SQLiteStore:
+    """
+    Durable store for annotations and feedback backed by an embedded SQLite database.
+
+    The database runs in WAL mode so several uvicorn workers can read while one
+    writes. Feedback is group-committed: a background writer collects the inserts
+    that arrive within a short window and commits them in a single transaction,
+    and each caller returns once its row is durable. The writer commits with
+    synchronous=FULL, so acknowledged feedback survives a power loss; annotations
+    use synchronous=NORMAL, which may lose the last commits on power loss (but not
+    on a process crash).
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 256, max_batch_delay: float = 0.005,
+                 busy_timeout: float = 30.0):
+        """
+        Open (and create, if needed) the database.
+
+        :param db_path: Path to the SQLite database file.
+        :param batch_size: Maximum number of feedback rows committed in one transaction.
+        :param max_batch_delay: Seconds the writer waits for more feedback before committing.
+        :param busy_timeout: Seconds to wait for another process's write lock.
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.max_batch_delay = max_batch_delay
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._feedback_queue = queue.Queue()
+        self._closed = False
+
+        with self._connection() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+        self._writer = threading.Thread(target=self._write_feedback_batches, name="feedback-writer", daemon=True)
+        self._writer.start()
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Return this thread's connection, opening it on first use.
+
+        :return: A SQLite connection.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._open_connection("NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _open_connection(self, synchronous: str) -> sqlite3.Connection:
+        """
+        Open a connection that is closed together with the store.
+
+        :param synchronous: SQLite synchronous level, "NORMAL" or "FULL".
+        :return: A SQLite connection.
+        """
+        # Each connection is used by one thread; check_same_thread is off only so close() can close them all
+        connection = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        connection.execute(f"PRAGMA synchronous={synchronous}")
+        with self._lock:
+            self._connections.append(connection)
+        return connection
+
+    def add_annotation(self, file_name: str, annotation: Dict[str, Any]):
+        """
+        Save an annotation for a PDF file.
+
+        :param file_name: The name of the PDF file.
+        :param annotation: Dictionary with page_number, text and coordinates.
+        """
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO annotations (file_name, page_number, text, coordinates, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (file_name, annotation["page_number"], annotation["text"],
+                 json.dumps(annotation["coordinates"]), _now()),
+            )
+
+    def get_annotations(self, file_name: str, page_number: Optional[int] = None, limit: Optional[int] = None,
+                        offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Retrieve annotations for a PDF file, ordered by page and insertion.
+
+        :param file_name: The name of the PDF file.
+        :param page_number: Optional page to restrict the annotations to.
+        :param limit: Optional maximum number of annotations to return.
+        :param offset: Number of annotations to skip.
+        :return: List of annotation dictionaries.
+        """
+        sql = "SELECT page_number, text, coordinates FROM annotations WHERE file_name = ?"
+        params = [file_name]
+        if page_number is not None:
+            sql += " AND page_number = ?"
+            params.append(page_number)
+        sql += " ORDER BY page_number, id LIMIT ? OFFSET ?"
+        params += [-1 if limit is None else limit, offset]
+
+        rows = self._connection().execute(sql, params).fetchall()
+        return [{"page_number": row["page_number"], "text": row["text"],
+                 "coordinates": json.loads(row["coordinates"])} for row in rows]
+
+    def count_annotations(self, file_name: str, page_number: Optional[int] = None) -> int:
+        """
+        Count the annotations stored for a PDF file.
+
+        :param file_name: The name of the PDF file.
+        :param page_number: Optional page to restrict the count to.
+        :return: Number of matching annotations.
+        """
+        sql = "SELECT COUNT(*) FROM annotations WHERE file_name = ?"
+        params = [file_name]
+        if page_number is not None:
+            sql += " AND page_number = ?"
+            params.append(page_number)
+        return self._connection().execute(sql, params).fetchone()[0]
+
+    def add_feedback(self, feedback: Dict[str, Any], timeout: Optional[float] = 30.0):
+        """
+        Save user feedback, returning once the batch containing it has been committed.
+
+        :param feedback: Dictionary with query, response, rating and comments.
+        :param timeout: Seconds to wait for the commit.
+        :raises RuntimeError: If the store is closed or the commit failed or timed out.
+        """
+        entry = {"row": (feedback["query"], feedback["response"], feedback["rating"],
+                         feedback.get("comments"), _now()),
+                 "done": threading.Event(), "error": None}
+        # Checked and enqueued under the lock so no entry can land behind close()'s sentinel
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Store is closed")
+            self._feedback_queue.put(entry)
+        if not entry["done"].wait(timeout):
+            raise RuntimeError("Timed out waiting for feedback to be committed")
+        if entry["error"] is not None:
+            raise RuntimeError(f"Failed to save feedback: {entry['error']}")
+
+    def get_feedback(self, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Retrieve saved feedback, most recent first.
+
+        :param limit: Maximum number of entries to return.
+        :param offset: Number of entries to skip.
+        :return: List of feedback dictionaries.
+        """
+        rows = self._connection().execute(
+            "SELECT query, response, rating, comments FROM feedback ORDER BY id DESC LIMIT ? OFFSET ?",
+            (limit, offset),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _write_feedback_batches(self):
+        """
+        Commit queued feedback in batches until the store is closed.
+        """
+        connection = self._open_connection("FULL")
+        while True:
+            entry = self._feedback_queue.get()
+            if entry is None:
+                return
+            batch = [entry]
+            deadline = time.monotonic() + self.max_batch_delay
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._feedback_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stop = True
+                    break
+                batch.append(entry)
+
+            try:
+                with connection:
+                    connection.executemany(
+                        "INSERT INTO feedback (query, response, rating, comments, created_at) VALUES (?, ?, ?, ?, ?)",
+                        [entry["row"] for entry in batch],
+                    )
+            except sqlite3.Error as e:
+                logging.error(f"Error committing {len(batch)} feedback entries: {str(e)}")
+                for entry in batch:
+                    entry["error"] = e
+            for entry in batch:
+                entry["done"].set()
+            if stop:
+                return
+
+    def close(self):
+        """
+        Flush pending feedback, stop the background writer and close all connections.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._feedback_queue.put(None)
+        self._writer.join()
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,91 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Collects items submitted by concurrent callers into batches for a single worker.
+
+    A background thread waits for the first item, keeps collecting for up to
+    max_wait_ms or until max_batch_size items are queued, runs them through
+    process_batch in one call and hands each caller back its own results.
+    """
+
+    def __init__(self, process_batch, max_batch_size=32, max_wait_ms=5.0, name="micro-batcher"):
+        """
+        Initializes the batcher.
+
+        :param process_batch: Callable taking a list of items and returning a list of results in the same order.
+        :param max_batch_size: The maximum number of items processed in one batch.
+        :param max_wait_ms: How long to wait for more items after the first one arrives, in milliseconds.
+        :param name: Name of the background thread.
+        """
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, items):
+        """
+        Queues items for batched processing and waits for their results.
+
+        :param items: A list of items to process.
+        :return: A list of results, one per item, in the same order.
+        :raises Exception: Whatever process_batch raised for the batch containing the items.
+        """
+        futures = []
+        for item in items:
+            future = Future()
+            self._queue.put((item, future))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def _run(self):
+        """
+        Forms and processes batches until the batcher is closed.
+        """
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                return
+            batch = [entry]
+            deadline = time.monotonic() + self.max_wait
+            closing = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    closing = True
+                    break
+                batch.append(entry)
+
+            items = [item for item, _ in batch]
+            try:
+                results = self.process_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"Batch returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                logging.error(f"Error processing batch of {len(items)} items: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+
+            if closing:
+                return
+
+    def close(self):
+        """
+        Stops the background thread after the queued items are processed.
+        """
+        self._queue.put(None)
+        self._thread.join()
@@ -0,0 +1,120 @@
+import re
+from collections import defaultdict
+
+import yake
+
+from monitoring.metrics import record_cache
+
+_extractors = {}
+
+
+def get_yake_extractor(n=3, dedup_lim=0.9, top=150):
+    """
+    Returns a configured YAKE extractor, reusing it across calls in this process.
+
+    :param n: The maximum n-gram size of keywords.
+    :param dedup_lim: The YAKE deduplication threshold.
+    :param top: The number of keywords to return.
+    :return: A yake.KeywordExtractor.
+    """
+    key = (n, dedup_lim, top)
+    record_cache("yake_extractor", key in _extractors)
+    if key not in _extractors:
+        _extractors[key] = yake.KeywordExtractor(lan="en", n=n, dedupLim=dedup_lim, top=top)
+    return _extractors[key]
+
+
+def score_chunk(chunk, n=3, dedup_lim=0.9, top=150):
+    """
+    Runs YAKE over one chunk of text.
+
+    :param chunk: The text of the chunk.
+    :param n: The maximum n-gram size of keywords.
+    :param dedup_lim: The YAKE deduplication threshold.
+    :param top: The number of keywords to return.
+    :return: A list of (lowercase keyword, score) pairs; lower scores are more relevant.
+    """
+    return [(kw.lower(), score) for kw, score in get_yake_extractor(n, dedup_lim, top).extract_keywords(chunk)]
+
+
+def _score_chunk_args(args):
+    return score_chunk(*args)
+
+
+def split_into_chunks(text, chunk_size=20000):
+    """
+    Splits text into section-sized chunks at blank lines.
+
+    Paragraphs are grouped until a chunk reaches chunk_size characters; a single
+    paragraph longer than that is split at line breaks.
+
+    :param text: The document text.
+    :param chunk_size: The target chunk size in characters.
+    :return: A list of text chunks.
+    """
+    chunks = []
+    current = []
+    current_size = 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        pieces = [paragraph] if len(paragraph) <= chunk_size else paragraph.splitlines()
+        for piece in pieces:
+            if current and current_size + len(piece) > chunk_size:
+                chunks.append("\n\n".join(current))
+                current = []
+                current_size = 0
+            current.append(piece)
+            current_size += len(piece) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def merge_chunk_scores(chunk_keywords, top=150):
+    """
+    Reduces per-chunk YAKE scores to one score per keyword.
+
+    A keyword's merged score is its best (lowest) chunk score divided by the number
+    of chunks it was found in, so terms that recur across sections rank higher.
+    Ties are broken alphabetically so the result does not depend on chunk timing.
+
+    :param chunk_keywords: A list of per-chunk (keyword, score) lists.
+    :param top: The number of keywords to keep.
+    :return: A dictionary mapping keywords to merged scores.
+    """
+    best = {}
+    occurrences = defaultdict(int)
+    for keywords in chunk_keywords:
+        for keyword, score in dict(keywords).items():
+            best[keyword] = min(score, best.get(keyword, score))
+            occurrences[keyword] += 1
+
+    merged = {keyword: best[keyword] / occurrences[keyword] for keyword in best}
+    ranked = sorted(merged, key=lambda keyword: (merged[keyword], keyword))[:top]
+    return {keyword: merged[keyword] for keyword in ranked}
+
+
+def extract_yake_scores_many(texts, executor=None, chunk_size=20000, n=3, dedup_lim=0.9, top=150):
+    """
+    Scores several documents with YAKE, chunking each one and scoring all chunks together.
+
+    :param texts: A list of document texts.
+    :param executor: Optional concurrent.futures executor used to score chunks in parallel.
+    :param chunk_size: The target chunk size in characters.
+    :param n: The maximum n-gram size of keywords.
+    :param dedup_lim: The YAKE deduplication threshold.
+    :param top: The number of keywords per document.
+    :return: A list of keyword-to-score dictionaries, one per document.
+    """
+    chunked = [split_into_chunks(text, chunk_size) for text in texts]
+    tasks = [(chunk, n, dedup_lim, top) for chunks in chunked for chunk in chunks]
+    if executor is None:
+        scored = [_score_chunk_args(task) for task in tasks]
+    else:
+        scored = list(executor.map(_score_chunk_args, tasks, chunksize=max(1, len(tasks) // 64)))
+
+    results = []
+    position = 0
+    for chunks in chunked:
+        results.append(merge_chunk_scores(scored[position:position + len(chunks)], top))
+        position += len(chunks)
+    return results
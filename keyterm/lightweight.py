@@ -0,0 +1,126 @@
+import os
+import re
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+
+# Replaces the NLTK data and the transformer NER model with the offline stand-ins
+# below, so the API can be booted for load tests without network access or model
+# weights. Key terms still go through windowing and micro-batching, but the stub
+# model does no real inference.
+LIGHTWEIGHT_MODELS = os.environ.get("OWLEYES_LIGHTWEIGHT_MODELS") == "1"
+
+# NLTK's English stopword list
+STOPWORDS = {
+    "i", "me", "my", "myself", "we", "our", "ours", "ourselves", "you", "you're", "you've", "you'll", "you'd",
+    "your", "yours", "yourself", "yourselves", "he", "him", "his", "himself", "she", "she's", "her", "hers",
+    "herself", "it", "it's", "its", "itself", "they", "them", "their", "theirs", "themselves", "what", "which",
+    "who", "whom", "this", "that", "that'll", "these", "those", "am", "is", "are", "was", "were", "be", "been",
+    "being", "have", "has", "had", "having", "do", "does", "did", "doing", "a", "an", "the", "and", "but", "if",
+    "or", "because", "as", "until", "while", "of", "at", "by", "for", "with", "about", "against", "between",
+    "into", "through", "during", "before", "after", "above", "below", "to", "from", "up", "down", "in", "out",
+    "on", "off", "over", "under", "again", "further", "then", "once", "here", "there", "when", "where", "why",
+    "how", "all", "any", "both", "each", "few", "more", "most", "other", "some", "such", "no", "nor", "not",
+    "only", "own", "same", "so", "than", "too", "very", "s", "t", "can", "will", "just", "don", "don't",
+    "should", "should've", "now", "d", "ll", "m", "o", "re", "ve", "y", "ain", "aren", "aren't", "couldn",
+    "couldn't", "didn", "didn't", "doesn", "doesn't", "hadn", "hadn't", "hasn", "hasn't", "haven", "haven't",
+    "isn", "isn't", "ma", "mightn", "mightn't", "mustn", "mustn't", "needn", "needn't", "shan", "shan't",
+    "shouldn", "shouldn't", "wasn", "wasn't", "weren", "weren't", "won", "won't", "wouldn", "wouldn't",
+}
+
+LABELS = {0: "O", 1: "B-ORG", 2: "I-ORG"}
+
+
+def pos_tag_sents(sentences):
+    """
+    Tags words as nouns unless they are stopwords or punctuation, in place of the NLTK tagger.
+
+    :param sentences: A list of token lists.
+    :return: A list of (token, tag) lists.
+    """
+    return [
+        [(token, "NN" if token.isalnum() and token.lower() not in STOPWORDS else "X") for token in tokens]
+        for tokens in sentences
+    ]
+
+
+class StubNERTokenizer:
+    """
+    Splits text into word pieces of at most six characters, with the interface of a
+    transformers fast tokenizer as used by TermExtractionHandler.
+    """
+
+    model_max_length = 512
+    pad_token_id = 0
+    piece_pattern = re.compile(r"\w{1,6}|[^\w\s]")
+
+    def __init__(self):
+        self.vocabulary = ["[PAD]", "[CLS]", "[SEP]"]
+        self._ids = {token: token_id for token_id, token in enumerate(self.vocabulary)}
+        self._lock = threading.Lock()
+
+    def _id(self, piece):
+        with self._lock:
+            if piece not in self._ids:
+                self._ids[piece] = len(self.vocabulary)
+                self.vocabulary.append(piece)
+            return self._ids[piece]
+
+    def __call__(self, text, add_special_tokens=True, return_offsets_mapping=False, verbose=True):
+        input_ids, offsets = [], []
+        for match in self.piece_pattern.finditer(text):
+            continued = bool(offsets) and offsets[-1][1] == match.start() and match.group()[0].isalnum()
+            input_ids.append(self._id(("##" if continued else "") + match.group()))
+            offsets.append(match.span())
+        if add_special_tokens:
+            input_ids = self.build_inputs_with_special_tokens(input_ids)
+            offsets = [(0, 0)] + offsets + [(0, 0)]
+        encoding = {"input_ids": input_ids}
+        if return_offsets_mapping:
+            encoding["offset_mapping"] = offsets
+        return encoding
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+    def build_inputs_with_special_tokens(self, ids):
+        return [1] + ids + [2]
+
+    def get_special_tokens_mask(self, ids, already_has_special_tokens=False):
+        return [1] + [0] * len(ids) + [1]
+
+    def convert_ids_to_tokens(self, token_id):
+        return self.vocabulary[token_id]
+
+    def convert_tokens_to_string(self, tokens):
+        return " ".join(tokens).replace(" ##", "")
+
+
+class StubNERModel:
+    """
+    Tags runs of capitalized words as organizations, in place of the BERT NER model.
+    """
+
+    def __init__(self, tokenizer):
+        """
+        :param tokenizer: The StubNERTokenizer whose ids the model receives.
+        """
+        self.tokenizer = tokenizer
+        self.config = SimpleNamespace(id2label=LABELS, max_position_embeddings=512)
+
+    def __call__(self, input_ids, attention_mask):
+        logits = np.zeros(input_ids.shape + (len(LABELS),), dtype=np.float32)
+        for row, ids in enumerate(input_ids):
+            inside = False
+            for position, token_id in enumerate(ids):
+                piece = self.tokenizer.vocabulary[token_id] if attention_mask[row, position] else ""
+                if piece.startswith("##"):
+                    label = 2 if inside else 0
+                elif token_id > 2 and piece[0].isupper():
+                    label = 2 if inside else 1
+                else:
+                    label = 0
+                logits[row, position, label] = 5.0
+                inside = label != 0
+        return SimpleNamespace(logits=logits)
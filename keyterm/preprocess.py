@@ -1,33 +1,154 @@
 import os
 import logging
-import yake
+import multiprocessing
+import threading
+from bisect import bisect_left
 import fitz
 import nltk
+import numpy as np
 from nltk.corpus import stopwords
-from nltk import word_tokenize, pos_tag
-from transformers import AutoTokenizer, TFAutoModelForTokenClassification, pipeline
-
-nltk.download("stopwords")
-nltk.download("punk")
-nltk.download("averaged_perceptron_tagger")
+from nltk import pos_tag_sents
+from nltk.tokenize import NLTKWordTokenizer, PunktSentenceTokenizer
+from transformers import AutoTokenizer, TFAutoModelForTokenClassification
+from concurrent.futures import ProcessPoolExecutor
+from keyterm import lightweight
+from keyterm.batching import MicroBatcher
+from keyterm.chunked_yake import extract_yake_scores_many, get_yake_extractor
+from monitoring.metrics import NER_BATCH_SIZE, time_stage, timed
+
+if lightweight.LIGHTWEIGHT_MODELS:  # Offline: bundled stopwords and a stub tagger instead of NLTK data
+    pos_tag_sents = lightweight.pos_tag_sents
+else:
+    nltk.download("stopwords")
+    nltk.download("punk")
+    nltk.download("averaged_perceptron_tagger")
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
 
+def _load_sentence_tokenizer():
+    """
+    Load the pretrained English Punkt model, falling back to an untrained Punkt tokenizer.
+
+    :return: A Punkt sentence tokenizer.
+    """
+    try:
+        from nltk.tokenize.punkt import PunktTokenizer
+        return PunktTokenizer("english")
+    except (ImportError, LookupError):
+        return PunktSentenceTokenizer()
+
+
+class TextAnalysis:
+    """
+    Sentence and token spans, POS tags and lowercase forms of a document, computed once
+    and shared by candidate filtering and NER window alignment.
+    """
+
+    sentence_tokenizer = None
+    word_tokenizer = NLTKWordTokenizer()
+
+    def __init__(self, text):
+        """
+        Tokenizes and POS-tags the text in a single pass.
+
+        :param text: The document text.
+        """
+        if TextAnalysis.sentence_tokenizer is None:
+            TextAnalysis.sentence_tokenizer = _load_sentence_tokenizer()
+
+        self.text = text
+        with time_stage("keyterm", "tokenization"):
+            self.sentence_spans = list(self.sentence_tokenizer.span_tokenize(text))
+            self.token_spans = []
+            self.sentence_token_ranges = []  # (first token, last token + 1) per sentence
+            sentence_tokens = []
+            for start, end in self.sentence_spans:
+                spans = [(start + token_start, start + token_end)
+                         for token_start, token_end in self.word_tokenizer.span_tokenize(text[start:end])]
+                self.sentence_token_ranges.append((len(self.token_spans), len(self.token_spans) + len(spans)))
+                self.token_spans.extend(spans)
+                sentence_tokens.append([text[token_start:token_end] for token_start, token_end in spans])
+
+        self.tokens = [token for tokens in sentence_tokens for token in tokens]
+        self.lower_tokens = [token.lower() for token in self.tokens]
+        with time_stage("keyterm", "pos_tagging"):
+            self.pos_tags = [tag for tagged in pos_tag_sents(sentence_tokens) for _, tag in tagged]
+        self.nouns = {
+            lower for lower, tag in zip(self.lower_tokens, self.pos_tags) if tag.startswith("NN")
+        }
+
+    def windows(self, max_tokens, token_lengths=None):
+        """
+        Groups consecutive sentences into windows of at most max_tokens model tokens.
+
+        Sentences longer than max_tokens are split at word boundaries. A single word
+        longer than max_tokens still gets a window of its own, which callers truncate.
+
+        :param max_tokens: The maximum number of model tokens per window.
+        :param token_lengths: Number of model tokens for each word in self.tokens; one per word if omitted.
+        :return: A list of (start, end) character spans into the text.
+        """
+        if token_lengths is None:
+            token_lengths = [1] * len(self.tokens)
+        windows = []
+        window_start = window_end = None
+        window_tokens = 0
+        for first, last in self.sentence_token_ranges:
+            if first == last:
+                continue
+            sentence_tokens = sum(token_lengths[first:last])
+            if window_start is not None and window_tokens + sentence_tokens > max_tokens:
+                windows.append((window_start, window_end))
+                window_start = None
+                window_tokens = 0
+            words = [(first, last)] if sentence_tokens <= max_tokens else [(i, i + 1) for i in range(first, last)]
+            for word_first, word_last in words:
+                length = sum(token_lengths[word_first:word_last])
+                if window_start is not None and window_tokens + length > max_tokens:
+                    windows.append((window_start, window_end))
+                    window_start = None
+                    window_tokens = 0
+                if window_start is None:
+                    window_start = self.token_spans[word_first][0]
+                window_end = self.token_spans[word_last - 1][1]
+                window_tokens += length
+        if window_start is not None:
+            windows.append((window_start, window_end))
+        return windows
+
+
 class TermExtractionHandler:
     """
     Handles the extraction and ranking of key terms from text using YAKE and NER models.
     """
 
-    def __init__(self):
+    def __init__(self, max_batch_size=32, max_batch_wait_ms=5.0, yake_workers=0, yake_chunk_size=20000,
+                 load_model=True):
         """
         Initializes the TermExtractionHandler with necessary models and stopwords.
+
+        :param max_batch_size: The maximum number of NER windows run through the model at once.
+        :param max_batch_wait_ms: How long NER windows from concurrent requests are collected before a batch runs.
+        :param yake_workers: Number of processes that score YAKE chunks in parallel; 0 runs YAKE in-process.
+        :param yake_chunk_size: Documents longer than this many characters are split into chunks for YAKE.
+        :param load_model: Whether to load the NER model (see load_ner_model); without it only YAKE terms are extracted.
         """
+        self.yake_workers = yake_workers
+        self.yake_chunk_size = yake_chunk_size
+        self._yake_pool = None
+        self._yake_pool_lock = threading.Lock()
         self.ner_model = None
         self.tokenizer = None
-        self.stop_words = set(stopwords.words("english"))
+        self.ner_batcher = MicroBatcher(
+            self._run_ner_batch,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_batch_wait_ms,
+            name="ner-batcher",
+        )
+        self.stop_words = set(lightweight.STOPWORDS if lightweight.LIGHTWEIGHT_MODELS else stopwords.words("english"))
         self.additional_stopwords = {
             "date",
             "time",
@@ -74,12 +195,17 @@ class TermExtractionHandler:
             "commencement",
         }
 
-        self.load_ner_model()
+        if load_model:
+            self.load_ner_model()
 
     def load_ner_model(self):
         """
-        Loads the NER model and tokenizer.
+        Loads the NER model and tokenizer, or their offline stubs with OWLEYES_LIGHTWEIGHT_MODELS=1.
         """
+        if lightweight.LIGHTWEIGHT_MODELS:
+            self.tokenizer = lightweight.StubNERTokenizer()
+            self.ner_model = lightweight.StubNERModel(self.tokenizer)
+            return
         self.tokenizer = AutoTokenizer.from_pretrained(
             "dbmdz/bert-large-cased-finetuned-conll03-english"
         )
@@ -87,6 +213,190 @@ class TermExtractionHandler:
             "dbmdz/bert-large-cased-finetuned-conll03-english"
         )
 
+    def ner_window_size(self):
+        """
+        Returns the number of word pieces that fit in one NER forward pass.
+
+        :return: The model's maximum input length minus the [CLS] and [SEP] tokens.
+        """
+        max_length = min(self.tokenizer.model_max_length, self.ner_model.config.max_position_embeddings)
+        return max_length - self.tokenizer.num_special_tokens_to_add()
+
+    def ner_windows(self, analysis):
+        """
+        Encodes the analysed text once and cuts the encoding into sentence-aligned windows.
+
+        :param analysis: The TextAnalysis of the document.
+        :return: A list of (word piece ids, character offsets into the text) pairs, one per window.
+        """
+        encoding = self.tokenizer(
+            analysis.text, add_special_tokens=False, return_offsets_mapping=True, verbose=False
+        )
+        input_ids, offsets = list(encoding["input_ids"]), list(encoding["offset_mapping"])
+        piece_starts = [start for start, _ in offsets]
+        token_lengths = [
+            bisect_left(piece_starts, end) - bisect_left(piece_starts, start)
+            for start, end in analysis.token_spans
+        ]
+
+        max_tokens = self.ner_window_size()
+        windows = []
+        for start, end in analysis.windows(max_tokens, token_lengths):
+            first = bisect_left(piece_starts, start)
+            last = min(bisect_left(piece_starts, end), first + max_tokens)  # Truncates a word longer than a window
+            if first < last:
+                windows.append((input_ids[first:last], offsets[first:last]))
+        return windows
+
+    def _run_ner_batch(self, windows):
+        """
+        Runs one batched NER forward pass over encoded windows from any number of requests.
+
+        Each window gets the model's special tokens, and the windows are padded to a
+        common length and run through the model in a single call (the transformers
+        pipeline runs TensorFlow inputs one at a time).
+
+        :param windows: A list of (word piece ids, character offsets) pairs from ner_windows.
+        :return: A list of entity lists, one per window, with the windows' character offsets.
+        """
+        NER_BATCH_SIZE.observe(len(windows))
+        with time_stage("keyterm", "ner_batch"):
+            rows = [self.tokenizer.build_inputs_with_special_tokens(list(ids)) for ids, _ in windows]
+            length = max(len(row) for row in rows)
+            input_ids = np.full((len(rows), length), self.tokenizer.pad_token_id)
+            attention_mask = np.zeros((len(rows), length), dtype=int)
+            skipped = np.ones((len(rows), length), dtype=bool)  # Special and padding tokens
+            offsets = np.zeros((len(rows), length, 2), dtype=int)
+            for row, (ids, window_offsets) in enumerate(windows):
+                size = len(rows[row])
+                input_ids[row, :size] = rows[row]
+                attention_mask[row, :size] = 1
+                skipped[row, :size] = np.array(
+                    self.tokenizer.get_special_tokens_mask(list(ids), already_has_special_tokens=False)
+                ) == 1
+                offsets[row, np.flatnonzero(~skipped[row])] = np.array(window_offsets).reshape(-1, 2)
+            logits = np.asarray(self.ner_model(input_ids=input_ids, attention_mask=attention_mask).logits)
+
+        shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        scores = shifted / shifted.sum(axis=-1, keepdims=True)
+        return [
+            self._aggregate_entities(input_ids[row], offsets[row], skipped[row], scores[row])
+            for row in range(len(windows))
+        ]
+
+    def _aggregate_entities(self, input_ids, offsets, skipped, scores):
+        """
+        Groups one window's token predictions into entities.
+
+        Follows the "simple" aggregation of the transformers NER pipeline: each token
+        takes its most likely label, and adjacent tokens of the same entity type are
+        merged unless a token starts a new entity (B- tag).
+
+        :param input_ids: The window's token ids.
+        :param offsets: The (start, end) character offsets of each token in the window.
+        :param skipped: Boolean mask of special and padding tokens.
+        :param scores: Label probabilities of each token.
+        :return: A list of entities with entity_group, score, word, start and end.
+        """
+        id2label = self.ner_model.config.id2label
+        groups = []
+        for index in np.flatnonzero(~skipped):
+            label = id2label[int(scores[index].argmax())]
+            bi, tag = (label[0], label[2:]) if label[:2] in ("B-", "I-") else ("I", label)
+            token = {
+                "tag": tag,
+                "score": float(scores[index].max()),
+                "token": self.tokenizer.convert_ids_to_tokens(int(input_ids[index])),
+                "start": int(offsets[index][0]),
+                "end": int(offsets[index][1]),
+            }
+            if groups and groups[-1][-1]["tag"] == tag and bi != "B":
+                groups[-1].append(token)
+            else:
+                groups.append([token])
+
+        return [
+            {
+                "entity_group": group[0]["tag"],
+                "score": float(np.mean([token["score"] for token in group])),
+                "word": self.tokenizer.convert_tokens_to_string([token["token"] for token in group]),
+                "start": group[0]["start"],
+                "end": group[-1]["end"],
+            }
+            for group in groups
+            if group[0]["tag"] != "O"
+        ]
+
+    def yake_executor(self):
+        """
+        Returns the process pool used for parallel YAKE scoring, creating it on first use.
+
+        :return: A ProcessPoolExecutor, or None if parallel YAKE is disabled.
+        """
+        with self._yake_pool_lock:  # Concurrent /key_terms/batch threads must not create several pools
+            if self.yake_workers and self._yake_pool is None:
+                self._yake_pool = ProcessPoolExecutor(
+                    max_workers=self.yake_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+        return self._yake_pool
+
+    @timed("keyterm", "yake")
+    def extract_yake_scores(self, text, top=150):
+        """
+        Scores n-gram keywords with YAKE, chunking long documents across the process pool.
+
+        :param text: The input text.
+        :param top: The number of keywords to return.
+        :return: A dictionary mapping lowercase keywords to YAKE scores (lower is more relevant).
+        """
+        if not self.yake_workers or len(text) <= self.yake_chunk_size:
+            yake_keywords = get_yake_extractor(n=3, dedup_lim=0.9, top=top).extract_keywords(text)
+            return {kw.lower(): score for kw, score in yake_keywords}
+        return extract_yake_scores_many(
+            [text], self.yake_executor(), chunk_size=self.yake_chunk_size, top=top
+        )[0]
+
+    def analyze(self, text):
+        """
+        Runs the shared sentence/token/POS analysis over the text.
+
+        :param text: The input text.
+        :return: A TextAnalysis of the text.
+        """
+        return TextAnalysis(text)
+
+    @timed("keyterm", "ner")
+    def extract_entities(self, analysis):
+        """
+        Runs NER over sentence-aligned windows of the analysed text.
+
+        The document is encoded by the NER tokenizer once, and windows of that encoding
+        are packed up to the model's input length, so the whole document is covered
+        without truncation or re-tokenizing the windows.
+
+        :param analysis: The TextAnalysis of the document.
+        :return: A list of entities with character offsets into the full text.
+        """
+        if self.ner_model is None:
+            return []
+        windows = self.ner_windows(analysis)
+        if not windows:
+            return []
+        return [entity for entities in self.ner_batcher.submit(windows) for entity in entities]
+
+    def extract_ner_terms(self, analysis):
+        """
+        Extracts multi-word named entities from the analysed text.
+
+        :param analysis: The TextAnalysis of the document.
+        :return: A set of lowercase entity terms.
+        """
+        return {
+            entity["word"].lower()
+            for entity in self.extract_entities(analysis)
+            if len(entity["word"].split()) > 1
+        }
+
     def extract_key_terms(self, text, max_terms=150):
         """
         Extracts key terms from the provided text using YAKE and NER models.
@@ -97,39 +407,27 @@ class TermExtractionHandler:
         """
         logging.info("Extracting keywords using YAKE and NER...")
 
-        yake_extractor = yake.KeywordExtractor(  # Extract using YAKE
-            lan="en", n=3, dedupLim=0.9, top=max_terms
-        )
-        yake_keywords = yake_extractor.extract_keywords(text)
-        yake_terms = set(kw.lower() for kw, _ in yake_keywords)
+        yake_terms = set(self.extract_yake_scores(text, top=max_terms))  # Extract using YAKE
         logging.info(f"YAKE keywords: {yake_terms}")
 
-        ner_pipeline = pipeline(  # Extract using NER
-            "ner",
-            model=self.ner_model,
-            tokenizer=self.tokenizer,
-            aggregation_strategy="simple",
-        )
-        ner_results = ner_pipeline(text)
-        ner_terms = set(
-            result["word"].lower()
-            for result in ner_results
-            if len(result["word"].split()) > 1
-        )
+        analysis = self.analyze(text)  # Shared tokenization for NER windows and filtering
+        ner_terms = self.extract_ner_terms(analysis)  # Extract using NER
         logging.info(f"NER keywords: {ner_terms}")
 
         all_terms = yake_terms.union(ner_terms)
 
-        filtered_terms = self.filter_terms(all_terms, text)  # Further filtering
+        filtered_terms = self.filter_terms(all_terms, text, analysis)  # Further filtering
         logging.info(f"Filtered keywords: {filtered_terms}")
         return filtered_terms
 
-    def filter_terms(self, terms, text):
+    @timed("keyterm", "filter_terms")
+    def filter_terms(self, terms, text, analysis=None):
         """
         Filters the extracted terms to remove stopwords and non-informative terms.
 
         :param terms: A set of extracted terms.
         :param text: The input text for context.
+        :param analysis: Optional TextAnalysis of the text, reused instead of re-tagging it.
         :return: A set of filtered and informative key terms.
         """
         logging.info("Filtering terms...")
@@ -139,9 +437,9 @@ class TermExtractionHandler:
         }
         logging.info(f"After stopwords removal: {filtered_terms}")
 
-        tokens = word_tokenize(text)  # Tokenize and POS tagging
-        pos_tags = pos_tag(tokens)
-        nouns = {word.lower() for word, pos in pos_tags if pos.startswith("NN")}
+        if analysis is None:  # Tokenize and POS tagging
+            analysis = self.analyze(text)
+        nouns = analysis.nouns
         logging.info(f"Nouns: {nouns}")  # Nouns and proper nouns
 
         final_terms = {  # Only keep terms that are nouns or proper nouns
@@ -184,36 +482,25 @@ class TermExtractionHandler:
         logging.info(f"Unique terms: {unique_terms}")
         return unique_terms
 
-    def extract_and_rank_key_terms(self, text):
+    @timed("keyterm", "extract_and_rank")
+    def extract_and_rank_key_terms(self, text, yake_terms=None):
         """
         Extracts and ranks key terms from the provided text using YAKE and NER models.
 
         :param text: The input text from which to extract key terms.
+        :param yake_terms: Optional precomputed YAKE keyword scores for the text.
         :return: A list of ranked key terms.
         """
         logging.info("Extracting and ranking key terms...")
 
-        yake_extractor = yake.KeywordExtractor(
-            lan="en", n=3, dedupLim=0.9, top=150
-        )  # Extract using YAKE for n-grams
-        yake_keywords = yake_extractor.extract_keywords(text)
-        yake_terms = {kw.lower(): score for kw, score in yake_keywords}
-
-        ner_pipeline = pipeline(  # Extract using NER
-            "ner",
-            model=self.ner_model,
-            tokenizer=self.tokenizer,
-            aggregation_strategy="simple",
-        )
-        ner_results = ner_pipeline(text)
-        ner_terms = {
-            result["word"].lower()
-            for result in ner_results
-            if len(result["word"].split()) > 1
-        }
+        if yake_terms is None:
+            yake_terms = self.extract_yake_scores(text)  # Extract using YAKE for n-grams
+
+        analysis = self.analyze(text)  # Shared tokenization for NER windows and filtering
+        ner_terms = self.extract_ner_terms(analysis)  # Extract using NER
 
         combined_terms = yake_terms.keys() | ner_terms  # Combine and filter terms
-        filtered_terms = self.filter_terms(combined_terms, text)
+        filtered_terms = self.filter_terms(combined_terms, text, analysis)
         term_scores = {
             term: yake_terms.get(term, 0) for term in filtered_terms
         }  # Rank terms by their combined relevance score (YAKE score for n-grams and frequency for NER terms)
@@ -233,6 +520,7 @@ class TermExtractionHandler:
             logging.error(f"PDF directory not found: {pdf_directory}")
             return
 
+        texts = {}
         for filename in os.listdir(pdf_directory):
             if filename.endswith(".pdf"):
                 pdf_path = os.path.join(pdf_directory, filename)
@@ -242,12 +530,20 @@ class TermExtractionHandler:
                 for page in doc:
                     text += page.get_text() + "\n"
                 doc.close()
+                texts[filename] = text
+
+        yake_scores = [None] * len(texts)
+        if self.yake_workers:  # Score the chunks of every document in one pass over the pool
+            yake_scores = extract_yake_scores_many(
+                list(texts.values()), self.yake_executor(), chunk_size=self.yake_chunk_size
+            )
 
-                key_terms = self.extract_and_rank_key_terms(text)
-                logging.info(f"Extracted terms for {filename}: {key_terms}")
-                print(f"Extracted terms for {filename}:")
-                for term in key_terms:
-                    print(term)
+        for (filename, text), yake_terms in zip(texts.items(), yake_scores):
+            key_terms = self.extract_and_rank_key_terms(text, yake_terms)
+            logging.info(f"Extracted terms for {filename}: {key_terms}")
+            print(f"Extracted terms for {filename}:")
+            for term in key_terms:
+                print(term)
 
 
 if __name__ == "__app__":
@@ -0,0 +1,284 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Metric:
+    """
+    Base class for a metric family with a fixed set of label names.
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, label_names=()):
+        """
+        :param name: Prometheus metric name.
+        :param documentation: Help text shown in the exposition.
+        :param label_names: Names of the labels every sample carries.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.label_names, key)) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def snapshot(self):
+        """
+        Copy the current values, e.g. to send them to another process.
+
+        :return: Dictionary mapping label value tuples to values.
+        """
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self, values=None, extra_labels=()):
+        """
+        List the samples of the metric family.
+
+        :param values: Values from snapshot() to list instead of this process's own.
+        :param extra_labels: (name, value) label pairs added to every sample.
+        :return: List of (sample name, formatted labels, value) tuples.
+        """
+        if values is None:
+            values = self.snapshot()
+        extra_labels = list(extra_labels)
+        return [(self.name, self._format_labels(key, extra_labels), value) for key, value in sorted(values.items())]
+
+    def render(self, remote=()):
+        """
+        Render the metric family in the Prometheus text format.
+
+        :param remote: (extra labels, values) pairs from other processes to render alongside this process's samples.
+        :return: List of exposition lines.
+        """
+        samples = self.samples()
+        for extra_labels, values in remote:
+            extra_labels = [(name, value) for name, value in extra_labels if name not in self.label_names]
+            samples += self.samples(values, extra_labels)
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines += [f"{name}{labels} {_format_value(value)}" for name, labels, value in samples]
+        return lines
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing count.
+    """
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Value that can go up and down.
+    """
+
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values over fixed buckets.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: ([*counts], total, count) for key, (counts, total, count) in self._values.items()}
+
+    def samples(self, values=None, extra_labels=()):
+        if values is None:
+            values = self.snapshot()
+        extra_labels = list(extra_labels)
+        samples = []
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = self._format_labels(key, extra_labels + [("le", _format_value(bound))])
+                samples.append((f"{self.name}_bucket", labels, cumulative))
+            samples.append((f"{self.name}_sum", self._format_labels(key, extra_labels), total))
+            samples.append((f"{self.name}_count", self._format_labels(key, extra_labels), count))
+        return samples
+
+
+class Registry:
+    """
+    Collection of metric families rendered together.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get_or_create(self, cls, name, documentation, label_names, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, label_names, **kwargs)
+            elif not isinstance(metric, cls) or metric.label_names != tuple(label_names):
+                raise ValueError(f"Metric {name} is already registered with a different type or labels")
+            return metric
+
+    def counter(self, name, documentation, label_names=()):
+        return self._get_or_create(Counter, name, documentation, label_names)
+
+    def gauge(self, name, documentation, label_names=()):
+        return self._get_or_create(Gauge, name, documentation, label_names)
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, label_names, buckets=buckets)
+
+    def snapshot(self):
+        """
+        Copy the values of every registered metric, e.g. to send them to another process.
+
+        :return: Dictionary mapping metric names to their snapshot() values.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def render(self, remote=()):
+        """
+        Render every registered metric in the Prometheus text format.
+
+        :param remote: (extra labels, registry snapshot) pairs from other processes, such as
+            ([("shard", "0")], snapshot); their samples are rendered with the extra labels added.
+        :return: The exposition text.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.render([(extra_labels, snapshot[metric.name]) for extra_labels, snapshot in remote
+                                    if snapshot.get(metric.name)])
+        return "\n".join(lines) + "\n"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return str(value)
+
+
+REGISTRY = Registry()
+
+STAGE_DURATION = REGISTRY.histogram(
+    "owleyes_stage_duration_seconds", "Time spent in each processing stage.", ("component", "stage"))
+CACHE_REQUESTS = REGISTRY.counter(
+    "owleyes_cache_requests_total", "Cache lookups by cache and result (hit or miss).", ("cache", "result"))
+INDEX_UNIQUE_WORDS = REGISTRY.gauge(
+    "owleyes_index_unique_words", "Number of unique words in the search index.", ("shard",))
+INDEX_NGRAMS = REGISTRY.gauge(
+    "owleyes_index_ngrams", "Number of distinct n-grams in the search index.", ("shard",))
+DOCUMENTS_INDEXED = REGISTRY.gauge(
+    "owleyes_documents_indexed", "Number of documents in the search index.", ("shard",))
+NER_BATCH_SIZE = REGISTRY.histogram(
+    "owleyes_ner_batch_size", "Number of text windows per NER forward pass.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "owleyes_http_request_duration_seconds", "HTTP request latency by route and status.",
+    ("method", "route", "status"))
+
+
+@contextmanager
+def time_stage(component, stage):
+    """
+    Record the duration of the enclosed block in the stage histogram.
+
+    :param component: Module the stage belongs to, e.g. "indexer".
+    :param stage: Name of the stage, e.g. "pdf_extraction".
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, component=component, stage=stage)
+
+
+def timed(component, stage):
+    """
+    Decorator that records every call of the function in the stage histogram.
+
+    :param component: Module the stage belongs to, e.g. "indexer".
+    :param stage: Name of the stage, e.g. "search".
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with time_stage(component, stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache(cache, hit):
+    """
+    Count a cache lookup.
+
+    :param cache: Name of the cache.
+    :param hit: Whether the lookup was a hit.
+    """
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def render_metrics(remote=()):
+    """
+    Render all metrics of this process in the Prometheus text format.
+
+    :param remote: (extra labels, registry snapshot) pairs from other processes to include.
+    :return: The exposition text.
+    """
+    return REGISTRY.render(remote)
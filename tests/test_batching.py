@@ -0,0 +1,44 @@
+import threading
+
+import pytest
+
+from keyterm.batching import MicroBatcher
+
+
+def test_concurrent_submissions_share_batches():
+    batches = []
+    batcher = MicroBatcher(lambda items: batches.append(list(items)) or [item * 2 for item in items],
+                           max_batch_size=8, max_wait_ms=50.0)
+    results = {}
+
+    def submit(caller):
+        results[caller] = batcher.submit([caller * 10 + i for i in range(3)])
+
+    threads = [threading.Thread(target=submit, args=(caller,)) for caller in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+
+    assert results == {caller: [(caller * 10 + i) * 2 for i in range(3)] for caller in range(4)}
+    assert sum(len(batch) for batch in batches) == 12
+    assert all(len(batch) <= 8 for batch in batches)
+    assert len(batches) < 12
+
+
+def test_batch_errors_reach_every_caller():
+    def fail(items):
+        raise ValueError("model failed")
+
+    batcher = MicroBatcher(fail, max_wait_ms=1.0)
+    with pytest.raises(ValueError, match="model failed"):
+        batcher.submit([1, 2])
+    batcher.close()
+
+
+def test_wrong_number_of_results_is_an_error():
+    batcher = MicroBatcher(lambda items: items[:1], max_wait_ms=1.0)
+    with pytest.raises(RuntimeError, match="2 items"):
+        batcher.submit([1, 2])
+    batcher.close()
@@ -0,0 +1,25 @@
+from keyterm.chunked_yake import merge_chunk_scores, split_into_chunks
+
+
+def test_merge_prefers_terms_found_in_several_chunks():
+    merged = merge_chunk_scores([
+        [("rent", 0.2), ("landlord", 0.1)],
+        [("rent", 0.3)],
+    ])
+
+    assert merged == {"rent": 0.1, "landlord": 0.1}
+    assert list(merged) == ["landlord", "rent"]  # Ties are broken alphabetically
+
+
+def test_merge_keeps_top_terms():
+    merged = merge_chunk_scores([[("alpha", 0.3), ("beta", 0.1), ("gamma", 0.2)]], top=2)
+
+    assert merged == {"beta": 0.1, "gamma": 0.2}
+
+
+def test_split_groups_paragraphs_up_to_chunk_size():
+    text = "\n\n".join(["a" * 40, "b" * 40, "c" * 40])
+
+    chunks = split_into_chunks(text, chunk_size=90)
+
+    assert chunks == ["a" * 40 + "\n\n" + "b" * 40, "c" * 40]
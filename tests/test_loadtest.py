@@ -0,0 +1,40 @@
+import pytest
+
+from benchmarks.loadtest import percentile, summarize
+
+
+@pytest.mark.parametrize("size, fraction, expected", [
+    (100, 0.50, 50),
+    (100, 0.95, 95),
+    (100, 0.99, 99),
+    (100, 1.00, 100),
+    (10, 0.50, 5),
+    (10, 0.95, 10),
+    (1, 0.50, 1),
+    (3, 0.0, 1),
+])
+def test_percentile_is_nearest_rank(size, fraction, expected):
+    assert percentile(list(range(1, size + 1)), fraction) == expected
+
+
+def test_percentile_of_empty_list():
+    assert percentile([], 0.5) is None
+
+
+def test_summarize_reports_each_endpoint_and_all():
+    samples = {
+        "search": [(0.010, 200), (0.020, 200), (0.030, 500), (0.040, None)],
+        "pdf": [(0.001, 200), (0.002, 404)],
+    }
+
+    report = summarize(samples, elapsed=2.0)
+
+    assert list(report) == ["pdf", "search", "all"]
+    assert report["search"]["requests"] == 4
+    assert report["search"]["throughput_rps"] == 2.0
+    assert report["search"]["error_rate"] == 0.5
+    assert report["search"]["p50_ms"] == pytest.approx(20.0)
+    assert report["search"]["p99_ms"] == pytest.approx(40.0)
+    assert report["pdf"]["error_rate"] == 0.0
+    assert report["all"]["requests"] == 6
+    assert report["all"]["error_rate"] == pytest.approx(2 / 6)
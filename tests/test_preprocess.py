@@ -0,0 +1,142 @@
+import re
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from keyterm import lightweight
+from keyterm.preprocess import TermExtractionHandler, TextAnalysis
+
+LABELS = {0: "O", 1: "B-ORG", 2: "I-ORG"}
+
+
+class StubTokenizer:
+    """
+    Whitespace tokenizer with the methods the handler uses.
+    """
+
+    model_max_length = 512
+    pad_token_id = 0
+
+    def __init__(self):
+        self.vocabulary = ["[PAD]", "[CLS]", "[SEP]"]
+        self.calls = 0
+
+    def _id(self, token):
+        if token not in self.vocabulary:
+            self.vocabulary.append(token)
+        return self.vocabulary.index(token)
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+    def build_inputs_with_special_tokens(self, ids):
+        return [1] + ids + [2]
+
+    def get_special_tokens_mask(self, ids, already_has_special_tokens=False):
+        return [1] + [0] * len(ids) + [1]
+
+    def convert_ids_to_tokens(self, token_id):
+        return self.vocabulary[token_id]
+
+    def convert_tokens_to_string(self, tokens):
+        return " ".join(tokens)
+
+    def __call__(self, text, add_special_tokens=True, return_offsets_mapping=False, verbose=True):
+        self.calls += 1
+        spans = [match.span() for match in re.finditer(r"\S+", text)]
+        return {"input_ids": [self._id(text[start:end]) for start, end in spans], "offset_mapping": spans}
+
+
+def encode(tokenizer, text):
+    encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+    return encoding["input_ids"], encoding["offset_mapping"]
+
+
+class StubModel:
+    """
+    Tags capitalized tokens as organizations and records every forward pass.
+    """
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.config = SimpleNamespace(id2label=LABELS, max_position_embeddings=512)
+        self.batch_sizes = []
+
+    def __call__(self, input_ids, attention_mask):
+        self.batch_sizes.append(len(input_ids))
+        logits = np.zeros(input_ids.shape + (len(LABELS),))
+        for row, ids in enumerate(input_ids):
+            previous = False
+            for position, token_id in enumerate(ids):
+                capitalized = token_id > 2 and self.tokenizer.vocabulary[token_id][0].isupper()
+                logits[row, position, (2 if previous else 1) if capitalized else 0] = 5.0
+                previous = capitalized
+        return SimpleNamespace(logits=logits)
+
+
+@pytest.fixture
+def handler():
+    handler = TermExtractionHandler(max_batch_size=4, max_batch_wait_ms=50.0, load_model=False)
+    handler.tokenizer = StubTokenizer()
+    handler.ner_model = StubModel(handler.tokenizer)
+    yield handler
+    handler.ner_batcher.close()
+
+
+def test_batch_runs_one_forward_pass(handler):
+    texts = [f"window {i} mentions Acme Holdings" for i in range(4)] + ["short"]
+
+    results = handler._run_ner_batch([encode(handler.tokenizer, text) for text in texts])
+
+    assert handler.ner_model.batch_sizes == [5]
+    assert len(results) == 5
+    assert results[-1] == []
+
+
+def test_entities_are_grouped_with_text_offsets(handler):
+    text = "lease between Acme Holdings Ltd and Bravo"
+    longer = "padding row that is longer than the first one"
+
+    entities = handler._run_ner_batch([encode(handler.tokenizer, text), encode(handler.tokenizer, longer)])[0]
+
+    assert [(entity["word"], entity["entity_group"]) for entity in entities] == [
+        ("Acme Holdings Ltd", "ORG"), ("Bravo", "ORG")]
+    assert [text[entity["start"]:entity["end"]] for entity in entities] == ["Acme Holdings Ltd", "Bravo"]
+
+
+def test_batcher_caps_forward_passes_at_batch_size(handler):
+    results = handler.ner_batcher.submit([encode(handler.tokenizer, f"Party{i} signs") for i in range(10)])
+
+    assert handler.ner_model.batch_sizes == [4, 4, 2]
+    assert [result[0]["word"] for result in results] == [f"Party{i}" for i in range(10)]
+
+
+def test_document_is_tokenized_once_and_cut_into_windows(handler, monkeypatch):
+    monkeypatch.setattr("keyterm.preprocess.pos_tag_sents",
+                        lambda sentences: [[(token, "NN") for token in tokens] for tokens in sentences])
+    handler.ner_model.config.max_position_embeddings = 10  # Windows of 8 word pieces: two sentences each
+    text = " ".join(f"Acme Holdings signs lease{i}." for i in range(10))
+
+    entities = handler.extract_entities(TextAnalysis(text))
+
+    assert handler.tokenizer.calls == 1
+    assert handler.ner_model.batch_sizes == [4, 1]
+    assert [text[entity["start"]:entity["end"]] for entity in entities] == ["Acme Holdings"] * 10
+
+
+def test_lightweight_models_extract_entities_offline(monkeypatch):
+    monkeypatch.setattr(lightweight, "LIGHTWEIGHT_MODELS", True)
+    monkeypatch.setattr("keyterm.preprocess.pos_tag_sents", lightweight.pos_tag_sents)
+    handler = TermExtractionHandler(max_batch_wait_ms=1.0)
+    text = "This lease is made between Northwind Holdings Limited and the tenant. Rent is due monthly."
+
+    try:
+        entities = handler.extract_entities(handler.analyze(text))
+    finally:
+        handler.ner_batcher.close()
+
+    assert isinstance(handler.ner_model, lightweight.StubNERModel)
+    assert "the" in handler.stop_words
+    assert [(entity["word"], text[entity["start"]:entity["end"]]) for entity in entities] == [
+        ("This", "This"), ("Northwind Holdings Limited", "Northwind Holdings Limited"), ("Rent", "Rent")]
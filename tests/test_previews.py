@@ -0,0 +1,56 @@
+import os
+
+from chatbot.previews import PreviewCache
+
+
+def cached_files(cache):
+    return sorted(name for name in os.listdir(cache.cache_dir) if not name.startswith("."))
+
+
+def test_get_returns_what_was_put(tmp_path):
+    cache = PreviewCache(str(tmp_path), max_bytes=1000)
+    cache.put("a.png", b"image")
+
+    assert cache.get("a.png") == b"image"
+    assert cache.get("missing.png") is None
+
+
+def test_least_recently_used_images_are_evicted_to_low_water_mark(tmp_path):
+    cache = PreviewCache(str(tmp_path), max_bytes=1000)
+    for i in range(10):
+        cache.put(f"{i}.png", b"x" * 100)
+        os.utime(tmp_path / f"{i}.png", ns=(i, i))  # Distinct recency regardless of clock resolution
+    cache.get("0.png")
+
+    cache.put("10.png", b"x" * 100)
+
+    assert cached_files(cache) == ["0.png", "10.png"] + [f"{i}.png" for i in range(3, 10)]
+    assert cache._read_total() == 900
+
+
+def test_directory_is_only_scanned_when_over_the_limit(tmp_path, monkeypatch):
+    cache = PreviewCache(str(tmp_path), max_bytes=1000)
+    cache.put("first.png", b"x" * 100)  # No running total yet, so the first write scans
+    scans = []
+    evict = cache._evict
+    monkeypatch.setattr(cache, "_evict", lambda: scans.append(1) or evict())
+
+    for i in range(8):
+        cache.put(f"{i}.png", b"x" * 100)
+    cache.put("0.png", b"x" * 50)  # Replacing an image only adds the difference
+
+    assert scans == []
+    assert cache._read_total() == 850
+
+    cache.put("big.png", b"x" * 200)
+
+    assert scans == [1]
+    assert cache._read_total() <= cache.low_water_bytes
+
+
+def test_running_total_is_shared_between_caches(tmp_path):
+    first, second = PreviewCache(str(tmp_path), max_bytes=1000), PreviewCache(str(tmp_path), max_bytes=1000)
+    for i in range(12):
+        (first if i % 2 else second).put(f"{i}.png", b"x" * 100)
+
+    assert sum(os.path.getsize(tmp_path / name) for name in cached_files(first)) <= 1000
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from autosearch.indexer import Indexer
+from autosearch.sharding import AUTHKEY_VARIABLE, ShardCoordinator, start_local_shards
+
+PDF_DIRECTORY = os.path.join(os.path.dirname(__file__), os.pardir, "pdf")
+
+
+@pytest.fixture(scope="module")
+def single():
+    return Indexer(PDF_DIRECTORY)
+
+
+@pytest.fixture(scope="module")
+def sharded():
+    coordinator = start_local_shards(PDF_DIRECTORY, 2)
+    yield coordinator
+    coordinator.close()
+
+
+def by_file_name(results):
+    return sorted(results, key=lambda result: result["file_name"])
+
+
+@pytest.mark.parametrize("query", ["rent", "purchase agreement", "tenant landlord", "agreemnt"])
+def test_search_matches_single_index(single, sharded, query):
+    assert by_file_name(sharded.search(query)) == by_file_name(single.search(query))
+
+
+@pytest.mark.parametrize("query", ["lea", "purchase", "employm", "agreemnt"])
+def test_autocomplete_matches_single_index(single, sharded, query):
+    assert sharded.autocomplete(query) == single.autocomplete(query)
+
+
+@pytest.mark.parametrize("query", ["rent deposit", "employee salary", "unknownword"])
+def test_alternative_search_matches_single_index(single, sharded, query):
+    assert by_file_name(sharded.alternative_search_results(query)) == \
+        by_file_name(single.alternative_search_results(query))
+
+
+def test_correct_query_matches_single_index(single, sharded):
+    query = "the tenent pays rnet on 12 dayz"
+
+    assert sharded.correct_query(query) == single.correct_query(query)
+
+
+def test_connect_requires_authkey(monkeypatch):
+    monkeypatch.delenv(AUTHKEY_VARIABLE, raising=False)
+
+    with pytest.raises(RuntimeError, match=AUTHKEY_VARIABLE):
+        ShardCoordinator.connect([("127.0.0.1", 7001)])
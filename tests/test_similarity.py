@@ -0,0 +1,48 @@
+import pytest
+
+from autosearch.similarity import SimilarityIndex
+
+
+@pytest.fixture
+def index():
+    index = SimilarityIndex(stopwords={"the"})
+    index.add_document("lease.pdf", ["the", "tenant", "pays", "rent", "to", "the", "landlord"])
+    index.add_document("sublease.pdf", ["tenant", "rent", "landlord", "sublet"])
+    index.add_document("loan.pdf", ["lender", "borrower", "interest"])
+    index.add_document("empty.pdf", [])
+    return index
+
+
+def test_most_similar_ranks_by_shared_terms(index):
+    results = index.most_similar("lease.pdf")
+
+    assert [result["file_name"] for result in results] == ["sublease.pdf"]
+    assert 0 < results[0]["score"] <= 1
+
+
+def test_documents_without_shared_terms_are_not_similar(index):
+    assert index.most_similar("loan.pdf") == []
+    assert index.most_similar("empty.pdf") == []
+
+
+def test_most_similar_unknown_document(index):
+    with pytest.raises(KeyError):
+        index.most_similar("missing.pdf")
+
+
+def test_most_similar_to_counts_excludes_documents(index):
+    results = index.most_similar_to_counts({"rent": 2, "landlord": 1}, exclude=("lease.pdf",))
+
+    assert [result["file_name"] for result in results] == ["sublease.pdf"]
+
+
+def test_document_counts_skip_stopwords(index):
+    assert index.document_counts("lease.pdf") == {"tenant": 1, "pays": 1, "rent": 1, "to": 1, "landlord": 1}
+
+
+def test_matrix_is_rebuilt_after_adding_documents(index):
+    before = index.matrix()
+    index.add_document("lease2.pdf", ["tenant", "pays", "rent"])
+
+    assert index.matrix() is not before
+    assert index.most_similar("lease2.pdf")[0]["file_name"] == "lease.pdf"
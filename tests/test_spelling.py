@@ -0,0 +1,43 @@
+from autosearch.spelling import SymSpellIndex, edit_distance
+
+
+def build_index():
+    index = SymSpellIndex()
+    for word, count in [("landlord", 10), ("tenant", 8), ("tenants", 3), ("lease", 5), ("least", 1)]:
+        index.add_word(word, count)
+    return index
+
+
+def test_known_word_is_returned_unchanged():
+    assert build_index().lookup("Tenant") == [("tenant", 0, 8)]
+
+
+def test_suggestions_are_ordered_by_distance_then_frequency():
+    assert build_index().lookup("leas") == [("lease", 1, 5), ("least", 1, 1)]
+
+
+def test_correct_handles_transpositions_and_unknown_terms():
+    index = build_index()
+
+    assert index.correct("landlrod") == "landlord"
+    assert index.correct("xyzzy") == "xyzzy"
+
+
+def test_lookup_respects_max_edit_distance():
+    index = build_index()
+
+    assert index.lookup("tenxxt", max_edit_distance=1) == []
+    assert index.lookup("tenxxt")[0][:2] == ("tenant", 2)
+
+
+def test_add_word_accumulates_frequency():
+    index = build_index()
+    index.add_word("lease", 2)
+
+    assert index.lookup("lease") == [("lease", 0, 7)]
+    assert len(index) == 5
+
+
+def test_edit_distance_counts_adjacent_transposition_once():
+    assert edit_distance("lease", "lesae", 2) == 1
+    assert edit_distance("lease", "landlord", 2) == 3